@@ -0,0 +1,57 @@
+"""草画像の出力形式ごとのファイルサイズとエンコード時間を計測する
+
+描画時間はプリセットごとに、エンコード時間は同じ描画結果に対して出力形式ごとに計測する
+
+プロジェクトルートで実行する
+
+    python -m benchmarks.heatmap_formats
+"""
+import argparse
+import datetime
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+from notifybot.libs import heatmap
+
+
+def create_series(end_date: datetime.date) -> pd.Series:
+    np.random.seed(sum(map(ord, 'calmap')))
+    all_days = pd.date_range(end=end_date, periods=365, freq='D')
+    days = np.random.choice(all_days, 200, replace=False)
+    return pd.Series(np.random.rand(len(days)), index=days)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    end_date = datetime.date(2022, 3, 1)
+    series = create_series(end_date)
+
+    print("{:<12} {:<8} {:>10} {:>10} {:>12}".format(
+        "format", "preset", "bytes", "draw (ms)", "encode (ms)"))
+    for preset in heatmap.PRESETS:
+        draw_times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            image = heatmap.draw(series, end_date=end_date, preset=preset)
+            draw_times.append(time.perf_counter() - start)
+
+        for format in heatmap.FORMAT_EXTENSIONS:
+            encode_times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                data = heatmap.encode(image, format=format)
+                encode_times.append(time.perf_counter() - start)
+            print("{:<12} {:<8} {:>10} {:>10.1f} {:>12.1f}".format(
+                format, preset, len(data),
+                statistics.median(draw_times) * 1000,
+                statistics.median(encode_times) * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,3 @@
 from .heatmap_cog import HeatMapCog
+from .status_cog import StatusCog
 from .voice_notify_cog import VoiceNotificationCog
@@ -1,60 +1,87 @@
+import asyncio
 import datetime
+import functools
 import io
 import logging
-import sqlite3
 from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
 
 import discord
-import matplotlib.pyplot as plt
 import pandas as pd
 from discord.commands import Option
 from discord.ext import commands
+
 from ..libs import heatmap
+from ..libs.debounce import PendingBuffer
+from ..storage import Storage
+from ..utils.timezone import next_midnight
 from ..vars import Data
 
 logger = logging.getLogger(__name__)
 
-FILENAME = "kusa.png"
+FILENAME = "kusa.{}".format(heatmap.FORMAT_EXTENSIONS[Data.HEATMAP_FORMAT])
 
 SECONDS_OF_24HOURS = 86400
 
 
 class HeatMapCog(commands.Cog):
-    def __init__(self, bot: discord.ext.commands.Bot) -> None:
+    """通話時間を草画像で可視化するCog
+
+    草画像は日付が変わるたびに描画範囲がずれるため、JSTの0時過ぎにサーバー全体とチャンネルごとの草画像を事前に生成しておく\\
+    通話が記録された場合は該当する草画像を破棄して、通話の記録が落ち着いてから再生成する
+
+    Attributes:
+        storage (Storage): 通話時間を読み込むストレージ
+        cache (Dict[Optional[str], Tuple[datetime.date, Optional[bytes]]]): チャンネル名ごとの生成日と草画像. 全体の草画像のキーはNone
+        rendering (Dict[Optional[str], Tuple[datetime.date, asyncio.Task]]): チャンネル名ごとの生成中の草画像
+    """
+
+    def __init__(self, bot: discord.ext.commands.Bot, storage: Storage) -> None:
         self.bot = bot
+        self.storage = storage
         self.server_id = Data.SERVER_ID
+        self.cache: Dict[Optional[str], Tuple[datetime.date, Optional[bytes]]] = {}
+        self.rendering: Dict[Optional[str], Tuple[datetime.date, asyncio.Task]] = {}
+        self._generations: Dict[Optional[str], int] = defaultdict(int)
+        self._render_semaphore = asyncio.Semaphore(
+            Data.HEATMAP_RENDER_CONCURRENCY)
+        self._idle_prerender: PendingBuffer[str, None] = PendingBuffer(
+            Data.HEATMAP_IDLE_SECONDS, lambda _: self.prerender_all())
+        self._scheduler: Optional[asyncio.Task] = None
+
+    def cog_unload(self) -> None:
+        if self._scheduler is not None:
+            self._scheduler.cancel()
+        self._idle_prerender.pop("prerender")
 
     @commands.Cog.listener()
     async def on_ready(self) -> None:
         logger.info(f"{self.__class__.__name__} is on ready.")
         self.guild = self.bot.get_guild(self.server_id)
 
-    def create_heatmap_file(self, series: pd.Series) -> discord.File:
-        end_date = datetime.datetime.now().date()
-        hm = heatmap.HeatMap(series, end_date=end_date)
-        fig, ax = plt.subplots()
-        hm.plot(vmin=0, vmax=max(series), linewidth=1, ax=ax)
-        fig.set_figheight(4)
-        fig.set_figwidth(16)
-        format = "png"
-        sio = io.BytesIO()
-        plt.savefig(sio, format=format)
-        sio.seek(0)
-        return discord.File(sio, filename=FILENAME)
-
-    def aggregate_access_time(self, channel: str = None) -> pd.Series:
-        con = sqlite3.connect(
-            Data.DB_NAME, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
-        sqlite3.dbapi2.converters['DATETIME'] = sqlite3.dbapi2.converters['TIMESTAMP']
-        cur = con.cursor()
-        dt_dict: defaultdict = defaultdict(int)
-        query = f"""SELECT start, end FROM {Data.ACCESS_TIME_TABLE}"""
-        query_kwargs = {}
-        if channel is not None:
-            query += "\nWHERE channel = :channel"
-            query_kwargs["channel"] = channel
+    @commands.Cog.listener()
+    async def on_storage_ready(self) -> None:
+        # テーブルが作成されてから事前生成を始める
+        # on_readyは再接続のたびに呼ばれるためスケジューラーは一つだけ起動する
+        self.guild = self.bot.get_guild(self.server_id)
+        if self._scheduler is None:
+            self._scheduler = asyncio.create_task(self._prerender_scheduler())
 
-        for start, end in cur.execute(query, query_kwargs):
+    @commands.Cog.listener()
+    async def on_access_time_committed(self, channel: str) -> None:
+        for key in (None, channel):
+            self.cache.pop(key, None)
+            # 生成中の古い草画像は待たずに、次の要求で生成し直す
+            self.rendering.pop(key, None)
+            self._generations[key] += 1
+        self._idle_prerender.push("prerender", None)
+
+    def create_heatmap_file(self, data: bytes) -> discord.File:
+        return discord.File(io.BytesIO(data), filename=FILENAME)
+
+    async def aggregate_access_time(self, channel: Optional[str] = None) -> pd.Series:
+        dt_dict: defaultdict = defaultdict(int)
+        for start, end in await self.storage.fetch_access_times(channel):
             dt_dict[start.date()] += (end - start).total_seconds() / \
                 SECONDS_OF_24HOURS
 
@@ -63,6 +90,93 @@ class HeatMapCog(commands.Cog):
 
         return series
 
+    def is_cached(self, channel: Optional[str], today: datetime.date) -> bool:
+        cached = self.cache.get(channel)
+        return cached is not None and cached[0] == today
+
+    async def prepare_heatmap(self, channel: Optional[str], today: datetime.date) -> Optional[bytes]:
+        """草画像を集計・生成してキャッシュする
+
+        すでに今日の草画像が生成されている場合はそれを返し、生成中の場合はその完了を待つ
+
+        Args:
+            channel (Optional[str]): チャンネル名. Noneの場合は全体
+            today (datetime.date): 草画像の最終日
+
+        Returns:
+            Optional[bytes]: 草画像. 通話記録がない場合はNone
+        """
+        cached = self.cache.get(channel)
+        if cached is not None and cached[0] == today:
+            return cached[1]
+
+        rendering = self.rendering.get(channel)
+        if rendering is None or rendering[0] != today:
+            task = asyncio.create_task(self._render_heatmap(channel, today))
+            self.rendering[channel] = (today, task)
+            task.add_done_callback(
+                functools.partial(self._discard_rendering, channel))
+        else:
+            task = rendering[1]
+
+        # 要求した側がキャンセルされても、同じ草画像を待つ他の要求のために生成は続ける
+        return await asyncio.shield(task)
+
+    def _discard_rendering(self, channel: Optional[str], task: asyncio.Task) -> None:
+        rendering = self.rendering.get(channel)
+        if rendering is not None and rendering[1] is task:
+            del self.rendering[channel]
+
+    async def _render_heatmap(self, channel: Optional[str], today: datetime.date) -> Optional[bytes]:
+        generation = self._generations[channel]
+        series = await self.aggregate_access_time(channel)
+        if len(series) == 0:
+            data = None
+        else:
+            # 描画とエンコードはどちらもスレッドで行う
+            render = functools.partial(heatmap.render, series,
+                                       end_date=today,
+                                       format=Data.HEATMAP_FORMAT,
+                                       preset=Data.HEATMAP_PRESET,
+                                       colors=Data.HEATMAP_PALETTE_COLORS)
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(None, render)
+
+        # 生成中に新しい通話が記録された場合は古い草画像をキャッシュしない
+        if self._generations[channel] == generation:
+            self.cache[channel] = (today, data)
+        return data
+
+    async def prerender_all(self) -> None:
+        """サーバー全体と各ボイスチャンネルの草画像を並列に事前生成する"""
+        today = datetime.datetime.now(tz=Data.JST).date()
+        channels: List[Optional[str]] = [None]
+        channels += [c.name for c in self.guild.voice_channels]
+        results = await asyncio.gather(*(self._prerender(channel, today) for channel in channels),
+                                       return_exceptions=True)
+        for channel, result in zip(channels, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to prerender heatmap: {channel}",
+                             exc_info=result)
+        logger.info(f"Prerendered {len(channels)} heatmaps for {today}.")
+
+    async def _prerender(self, channel: Optional[str], today: datetime.date) -> Optional[bytes]:
+        # 同時に生成する数を制限するのは事前生成だけにして、/kusaは順番待ちさせない
+        async with self._render_semaphore:
+            return await self.prepare_heatmap(channel, today)
+
+    async def _prerender_scheduler(self) -> None:
+        while True:
+            try:
+                await self.prerender_all()
+            except Exception:
+                logger.exception("Failed to prerender heatmaps.")
+
+            now = datetime.datetime.now(tz=Data.JST)
+            run_at = next_midnight(now) + datetime.timedelta(
+                seconds=Data.HEATMAP_PRERENDER_DELAY_SECONDS)
+            await asyncio.sleep((run_at - now).total_seconds())
+
     @commands.slash_command(description="通話時間の可視化")
     async def kusa(self,
                    ctx,
@@ -71,15 +185,19 @@ class HeatMapCog(commands.Cog):
             return
 
         content = ""
+        today = datetime.datetime.now(tz=Data.JST).date()
+        key = channel.name if channel else None
 
+        # 生成を待つ場合はインタラクションの応答期限を過ぎないように先に応答を保留する
+        if not self.is_cached(key, today):
+            await ctx.defer()
+
+        data = await self.prepare_heatmap(key, today)
         if channel:
-            series = self.aggregate_access_time(channel.name)
             content = channel.name
-        else:
-            series = self.aggregate_access_time()
 
-        if len(series) == 0:
+        if data is None:
             await ctx.respond(content="データが見つかりませんでした")
             return
 
-        await ctx.respond(content=content, file=self.create_heatmap_file(series))
+        await ctx.respond(content=content, file=self.create_heatmap_file(data))
@@ -0,0 +1,186 @@
+import asyncio
+import datetime
+import logging
+from typing import List, Optional
+
+import discord
+from discord.ext import commands
+
+from ..libs.sessions import SessionTracker
+from ..vars import Data
+
+logger = logging.getLogger(__name__)
+
+STATUS_TITLE = "通話状況"
+
+# Embedの上限. 超えるとメッセージの送信・編集が400で失敗する
+EMBED_MAX_FIELDS = 25
+EMBED_MAX_FIELD_NAME = 256
+EMBED_MAX_FIELD_VALUE = 1024
+EMBED_MAX_TOTAL = 6000
+# タイトルとフッター用に残しておく文字数
+EMBED_RESERVED = 100
+
+
+def clamp_lines(lines: List[str], limit: int) -> str:
+    """上限の文字数に収まるまで行を並べ、収まらなかった行数を末尾に表示する
+
+    Args:
+        lines (List[str]): 表示する行
+        limit (int): 上限の文字数
+
+    Returns:
+        str: 改行で連結した文字列
+    """
+    text = ""
+    for i, line in enumerate(lines):
+        candidate = line if not text else f"{text}\n{line}"
+        rest = len(lines) - i - 1
+        # 残りの行がある場合は省略表示の分の余白を残す
+        suffix = f"\n…他{rest}人" if rest else ""
+        if len(candidate) + len(suffix) > limit:
+            return f"{text}\n…他{len(lines) - i}人" if text else f"…他{len(lines)}人"
+        text = candidate
+    return text
+
+
+def create_status_embed(sessions: SessionTracker, now: datetime.datetime) -> discord.Embed:
+    """進行中の通話の一覧を表示するEmbedを作成する
+
+    Args:
+        sessions (SessionTracker): 進行中の通話
+        now (datetime.datetime): 最終更新として表示する現在時刻
+
+    Returns:
+        discord.Embed: チャンネルごとの参加者と経過時間を並べたEmbed
+    """
+    embed = discord.Embed(title=STATUS_TITLE, description="",
+                          color=discord.Colour.green())
+
+    snapshot = sessions.snapshot()
+    if not snapshot:
+        embed.description = "通話中のチャンネルはありません"
+
+    # フィールド数の上限を超える場合は最後のフィールドに残りのチャンネル数を表示する
+    shown = snapshot
+    if len(snapshot) > EMBED_MAX_FIELDS:
+        shown = snapshot[:EMBED_MAX_FIELDS - 1]
+    field_limit = (EMBED_MAX_TOTAL - EMBED_RESERVED) // min(len(snapshot), EMBED_MAX_FIELDS) if snapshot else 0
+
+    # 経過時間はDiscordのタイムスタンプで表示して、編集しなくてもクライアント側で更新されるようにする
+    for session in shown:
+        name = f"`{session.channel_name}`"[:EMBED_MAX_FIELD_NAME]
+        lines = [f"{p.name}さん ({discord.utils.format_dt(p.joined_at, 'R')})"
+                 for p in session.members.values()]
+        header = f"開始: {discord.utils.format_dt(session.started_at, 'R')}"
+        limit = min(EMBED_MAX_FIELD_VALUE, field_limit - len(name)) - len(header) - 1
+        embed.add_field(name=name, value=f"{header}\n{clamp_lines(lines, limit)}", inline=False)
+
+    if len(shown) < len(snapshot):
+        embed.add_field(name=f"他{len(snapshot) - len(shown)}チャンネル", value="…", inline=False)
+
+    embed.set_footer(text=f"最終更新: {now.strftime('%Y/%m/%d %H:%M:%S')}")
+    return embed
+
+
+class StatusCog(commands.Cog):
+    """進行中の通話を表示するCog
+
+    `/now`コマンドと通知チャンネルにピン留めしたメッセージで、チャンネルごとの参加者と経過時間を表示する\\
+    表示はメモリ上の通話状況から作成するため、データベースにはアクセスしない\\
+    ピン留めしたメッセージの編集は、入退室がどれだけ多くても更新間隔ごとに最大一回にまとめる
+
+    Attributes:
+        sessions (SessionTracker): 進行中の通話
+        update_interval (float): ピン留めしたメッセージを編集する最短の間隔(秒)
+    """
+
+    def __init__(self,
+                 bot: commands.Bot,
+                 sessions: SessionTracker,
+                 update_interval: float = Data.STATUS_UPDATE_INTERVAL_SECONDS) -> None:
+        self.bot = bot
+        self.sessions = sessions
+        self.update_interval = update_interval
+        self.notify_channel_id = Data.NOTIFY_CHANNEL_ID
+        self.server_id = Data.SERVER_ID
+        self.status_message: Optional[discord.Message] = None
+        self._update_task: Optional[asyncio.Task] = None
+        self._dirty = False
+
+    def cog_unload(self) -> None:
+        if self._update_task is not None:
+            self._update_task.cancel()
+
+    @commands.Cog.listener()
+    async def on_ready(self) -> None:
+        logger.info(f"{self.__class__.__name__} is on ready.")
+
+        self.notify_channel = self.bot.get_channel(self.notify_channel_id)
+        self.guild = self.bot.get_guild(self.server_id)
+
+        if self.status_message is None:
+            self.status_message = await self.find_or_create_status_message()
+
+    async def find_or_create_status_message(self) -> Optional[discord.Message]:
+        """通知チャンネルにピン留めされている通話状況のメッセージを返す
+
+        見つからない場合は新しく送信してピン留めする\
+        権限不足でピン留めできない場合もメッセージは送信して、ピン留めせずに更新を続ける
+
+        Returns:
+            Optional[discord.Message]: 通話状況のメッセージ. 送信できなかった場合はNone
+        """
+        try:
+            for message in await self.notify_channel.pins():
+                if message.author == self.bot.user and \
+                        message.embeds and message.embeds[0].title == STATUS_TITLE:
+                    return message
+        except discord.Forbidden:
+            logger.warning("Missing permission to read pinned messages.")
+
+        now = datetime.datetime.now(tz=Data.JST)
+        try:
+            message = await self.notify_channel.send(embed=create_status_embed(self.sessions, now))
+        except discord.HTTPException:
+            logger.exception("Failed to send status message.")
+            return None
+
+        try:
+            await message.pin()
+        except discord.HTTPException:
+            # 権限不足やピン留め数の上限の場合
+            logger.exception("Failed to pin status message.")
+        return message
+
+    @commands.Cog.listener()
+    async def on_voice_session_update(self) -> None:
+        # 更新待ちや編集中に届いたイベントは次の一回の編集にまとめる
+        self._dirty = True
+        if self._update_task is None or self._update_task.done():
+            self._update_task = asyncio.create_task(self._update_status_message())
+
+    async def _update_status_message(self) -> None:
+        while self._dirty:
+            await asyncio.sleep(self.update_interval)
+            # 編集中に届いたイベントを取りこぼさないように、Embedを作る前にフラグを下ろす
+            self._dirty = False
+            if self.status_message is None:
+                continue
+
+            now = datetime.datetime.now(tz=Data.JST)
+            try:
+                await self.status_message.edit(embed=create_status_embed(self.sessions, now))
+            except discord.NotFound:
+                # ピン留めしたメッセージが削除された場合は作り直す
+                self.status_message = await self.find_or_create_status_message()
+            except discord.HTTPException:
+                logger.exception("Failed to update status message.")
+
+    @commands.slash_command(description="現在の通話状況")
+    async def now(self, ctx) -> None:
+        if ctx.guild != self.guild:
+            return
+
+        now = datetime.datetime.now(tz=Data.JST)
+        await ctx.respond(embed=create_status_embed(self.sessions, now))
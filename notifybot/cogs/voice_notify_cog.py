@@ -1,11 +1,14 @@
 import datetime
 import logging
-import sqlite3
-from typing import Optional, Tuple
+from typing import Tuple
 
 import discord
 from discord.ext import commands
 
+from ..libs.debounce import PendingBuffer
+from ..libs.locks import KeyedLock
+from ..libs.sessions import SessionTracker
+from ..storage import Storage
 from ..vars import Data
 
 logger = logging.getLogger(__name__)
@@ -21,161 +24,46 @@ def timedelta_to_str(td: datetime.timedelta):
     return "{:02}:{:02}:{:02}".format(hours, minutes, seconds)
 
 
-def is_commitable(member_id: int, channel: str, is_enter: bool = True) -> Optional[bool]:
-    """入退室イベントが記録可能かを返す
+PendingExitKey = Tuple[int, int]
+ChannelKey = Tuple[int, int]
+PendingExit = Tuple[discord.User, discord.VoiceChannel, datetime.datetime]
 
-    何らかの不具合で入室が記録されないまま退室履歴を記録すると、その後の入退室通知が行われなくなる\\
-    そのため退室イベント発火時に直前の履歴が入室かどうかを調べ、入室じゃない場合に退室時の処理をスキップする\\
-    同様の理由で入室イベント時にも直前の履歴が入室の場合は処理をスキップする
-
-    Args:
-        member_id (int): メンバーのID
-        channel (str): チャンネル
-        is_enter (bool): 入室イベントかどうか. Default is True
-
-    Returns:
-        bool: 入退室イベントが記録可能か
-    """
-
-    con = sqlite3.connect(Data.DB_NAME)
-    cur = con.cursor()
-    cur.execute("""SELECT is_entering FROM vc_access_history
-                    WHERE user_id = :user_id
-                    AND channel = :channel
-                    ORDER BY access_datetime DESC
-                    LIMIT 1""", {"user_id": member_id,
-                                 "channel": channel})
-    result = cur.fetchone()
-    if result is None:
-        return is_enter
-
-    con.close()
-
-    return not (bool(result[0]) is is_enter)
-
-
-def is_already_entering(member_id: int, channel: str) -> bool:
-    """すでにチャンネルへ入室済みか
-
-    一度退出したチャンネルでの通話が終わる前に入室したとき、その入室記録を通知しない\\
-    最後の通話記録の終了時間より後に退室記録が存在するかどうかを返す
-
-    Args:
-        member_id (int): 入室したメンバーのID
-        channel (str): 入室したチャンネル
-
-    Returns:
-        bool: 退室記録が存在するか
-    """
-    con = sqlite3.connect(Data.DB_NAME)
-    cur = con.cursor()
-    cur.execute("""SELECT count(*) FROM vc_access_history
-                    WHERE access_datetime > (SELECT end FROM access_time WHERE channel = :channel ORDER BY end DESC LIMIT 1)
-                    AND user_id = :user_id
-                    AND channel = :channel
-                    AND is_entering = 0
-                    LIMIT 1""", {"user_id": member_id,
-                                 "channel": channel})
-    is_exist = cur.fetchone()[0]
-    con.close()
-
-    return bool(is_exist)
-
-
-def commit_history(member_id: int, channel: str, now: datetime.datetime, is_entering: bool) -> None:
-    """入退室記録を追加する
-
-    Args:
-        member_id (int): メンバーのID
-        channel (str): チャンネル名
-        now (datetime.datetime): 記録時間
-        is_entering (bool): 入室かどうか
-    """
-    con = sqlite3.connect(Data.DB_NAME)
-    cur = con.cursor()
-    cur.execute(
-        "INSERT INTO vc_access_history(user_id, channel, access_datetime, is_entering) VALUES (?,?,?,?)",
-        (member_id, channel, now.strftime("%Y-%m-%d %H:%M:%S.%f"), is_entering))
-    con.commit()
-    con.close()
-
-
-def is_all_member_exited_from(channel: str) -> bool:
-    """チャンネルから全員退室したか
-
-    チャンネルに誰か入ってから全員抜けるまでを通話時間とする\\
-    直近の通話記録の終了時間より後の入室記録と退室記録の数を比較して、一致するかどうかを返す\\
-    入室記録と退出記録の数が同じとき、全員そのチャンネルから退出したと判断する
 
+class VoiceNotificationCog(commands.Cog):
+    """ボイスチャンネルへの入退室を記録・通知するCog
 
-    Args:
-        channel (str): チャンネル名
+    通信が不安定なメンバーの瞬断で入退室が記録・通知されないように、退室イベントは猶予時間だけ保留する\\
+    猶予時間内に同じチャンネルへ再入室した場合は退室と再入室をどちらも記録せず、通知も行わない\\
+    入退室の確認・記録・通知はチャンネルごとにロックして順番に処理し、異なるチャンネルのイベントは並行して処理する
 
-    Return:
-        bool: 全員退出したか
+    Attributes:
+        storage (Storage): 入退室履歴を記録するストレージ
+        sessions (SessionTracker): 進行中の通話. 保留中の退室はまだ通話中として扱う
+        exit_grace_seconds (float): 退室を保留する秒数. 0以下の場合は保留しない
+        channel_locks (KeyedLock[ChannelKey]): サーバーIDとチャンネルIDごとのロック
     """
-    con = sqlite3.connect(Data.DB_NAME)
-    cur = con.cursor()
-    cur.execute("""SELECT count(*) FROM vc_access_history
-                    WHERE access_datetime > (SELECT end FROM access_time WHERE channel = :channel ORDER BY end DESC LIMIT 1)
-                    AND channel = :channel
-                    AND is_entering = 1""", {"channel": channel})
-    enter_count = cur.fetchone()
-    cur.execute("""SELECT count(*) FROM vc_access_history
-                    WHERE access_datetime > (SELECT end FROM access_time WHERE channel = :channel ORDER BY end DESC LIMIT 1)
-                    AND channel = :channel
-                    AND is_entering = 0""", {"channel": channel})
-    exit_count = cur.fetchone()
-    con.close()
-
-    return enter_count[0] == exit_count[0]
-
-
-def commit_access_time(channel: str) -> Tuple[str, str]:
-    """通話時間を記録して開始終了時間を返す
-
-    入退室記録からそのチャンネルの最初の入室記録と最後の退出記録を通話時間を記録して、開始終了時間を返す
-
-    Args:
-        channel (str): チャンネル名
-    Return:
-        Tuple[str, str]: 入室時間と退出時間の文字列
-    """
-    con = sqlite3.connect(Data.DB_NAME)
-    cur = con.cursor()
-    cur.execute("""SELECT end FROM access_time WHERE channel = :channel ORDER BY end DESC LIMIT 1""", {
-                "channel": channel})
-    end = cur.fetchone()
-    if end is None:
-        end = "2000-01-01 00:00:00"
-    else:
-        end = end[0]
-
-    cur.execute("""SELECT access_datetime FROM vc_access_history
-                    WHERE access_datetime > :end
-                    AND channel = :channel
-                    AND is_entering = 1
-                    ORDER BY access_datetime LIMIT 1""", {"channel": channel, "end": end})
-    first_enter_time = cur.fetchone()[0]
-    cur.execute("""SELECT access_datetime FROM vc_access_history
-                    WHERE access_datetime > :end
-                    AND channel = :channel
-                    AND is_entering = 0
-                    ORDER BY access_datetime DESC LIMIT 1""", {"channel": channel, "end": end})
-    last_exit_time = cur.fetchone()[0]
-    cur.execute("""INSERT INTO access_time(start, end, channel) VALUES (?,?,?)""",
-                (first_enter_time, last_exit_time, channel))
-    con.commit()
-    con.close()
-
-    return first_enter_time, last_exit_time
-
 
-class VoiceNotificationCog(commands.Cog):
-    def __init__(self, bot: commands.Bot):
+    def __init__(self,
+                 bot: commands.Bot,
+                 storage: Storage,
+                 sessions: SessionTracker,
+                 exit_grace_seconds: float = Data.EXIT_GRACE_SECONDS):
         self.bot = bot
+        self.storage = storage
+        self.sessions = sessions
         self.notify_channel_id = Data.NOTIFY_CHANNEL_ID
         self.server_id = Data.SERVER_ID
+        self.exit_grace_seconds = exit_grace_seconds
+        self.pending_exits: PendingBuffer[PendingExitKey, PendingExit] = PendingBuffer(
+            exit_grace_seconds, self._finalize_exit)
+        self.channel_locks: KeyedLock[ChannelKey] = KeyedLock()
+
+    async def close(self):
+        """保留中の退室を猶予時間を待たずにすべて記録する
+
+        Botの終了時に呼び出して、保留中の退室が記録されないまま失われないようにする
+        """
+        await self.pending_exits.flush()
 
     @commands.Cog.listener()
     async def on_ready(self):
@@ -187,9 +75,33 @@ class VoiceNotificationCog(commands.Cog):
         logger.debug(f"Notify Channel is {self.notify_channel}")
         logger.debug(f"Guild is {self.guild}")
 
+        # 起動前や切断中の入退室を反映する
+        now = datetime.datetime.now(tz=Data.JST)
+        for channel in self.guild.voice_channels:
+            async with self.channel_locks((channel.guild.id, channel.id)):
+                self.sessions.sync(channel.id, str(channel),
+                                   {m.id: m.display_name for m in channel.members}, now)
+        self.bot.dispatch("voice_session_update")
+
     async def enter(self, member: discord.User, channel: discord.VoiceChannel, now: datetime.datetime):
+        # ロックを待っている間に猶予時間が過ぎて退室が確定しないように、保留中の退室はロックの前に取り消す
+        if self.pending_exits.pop((member.id, channel.id)) is not None:
+            logger.info(
+                f"""(Merged) [VC UPDATE (Reconnect)]\tUser: {member}\tChannel:{channel}""")
+            self.sessions.enter(channel.id, str(channel),
+                                member.id, member.display_name, now)
+            return
+
+        async with self.channel_locks((channel.guild.id, channel.id)):
+            await self._enter(member, channel, now)
 
-        if not is_commitable(member.id, str(channel)):
+    async def _enter(self, member: discord.User, channel: discord.VoiceChannel, now: datetime.datetime):
+
+        self.sessions.enter(channel.id, str(channel),
+                            member.id, member.display_name, now)
+        self.bot.dispatch("voice_session_update")
+
+        if not await self.storage.is_commitable(member.id, str(channel)):
             logger.info(
                 f"""(Skipped) [VC UPDATE (Enter)]\tUser: {member}\tChannel:{channel}""")
             return
@@ -197,9 +109,9 @@ class VoiceNotificationCog(commands.Cog):
         logger.info(
             f"""[VC UPDATE (Enter)]\tUser: {member}\tChannel:{channel} """)
 
-        commit_history(member.id, str(channel), now, True)
+        await self.storage.commit_history(member.id, str(channel), now, True)
 
-        if is_already_entering(member.id, str(channel)):
+        if await self.storage.is_already_entering(member.id, str(channel)):
             return
 
         embed = discord.Embed(title="通話開始", description="",
@@ -214,7 +126,25 @@ class VoiceNotificationCog(commands.Cog):
 
     async def exit(self, member: discord.User, channel: discord.VoiceChannel, now: datetime.datetime):
 
-        if not is_commitable(member.id, str(channel), is_enter=False):
+        if self.exit_grace_seconds <= 0:
+            await self._finalize_exit((member, channel, now))
+            return
+
+        logger.debug(
+            f"""(Pending) [VC UPDATE (Exit)]\tUser: {member}\tChannel:{channel}""")
+        self.pending_exits.push((member.id, channel.id), (member, channel, now))
+
+    async def _finalize_exit(self, pending_exit: PendingExit):
+        member, channel, now = pending_exit
+        async with self.channel_locks((channel.guild.id, channel.id)):
+            await self._commit_exit(member, channel, now)
+
+    async def _commit_exit(self, member: discord.User, channel: discord.VoiceChannel, now: datetime.datetime):
+
+        self.sessions.exit(channel.id, member.id)
+        self.bot.dispatch("voice_session_update")
+
+        if not await self.storage.is_commitable(member.id, str(channel), is_enter=False):
             logger.info(
                 f"""(Skipped) [VC UPDATE (Exit)]\tUser: {member}\tChannel:{channel}""")
             return
@@ -222,15 +152,16 @@ class VoiceNotificationCog(commands.Cog):
         logger.info(
             f"""[VC UPDATE (Exit)]\tUser: {member}\tChannel:{channel}""")
 
-        commit_history(member.id, str(channel), now, False)
+        await self.storage.commit_history(member.id, str(channel), now, False)
 
-        if is_all_member_exited_from(str(channel)):
-            start, end = commit_access_time(str(channel))
-            start_dt = datetime.datetime.strptime(
-                start, "%Y-%m-%d %H:%M:%S.%f")
-            end_dt = datetime.datetime.strptime(end, "%Y-%m-%d %H:%M:%S.%f")
+        if await self.storage.is_all_member_exited_from(str(channel)):
+            access_time = await self.storage.commit_access_time(str(channel))
+            if access_time is None:
+                return
+            start, end = access_time
+            self.bot.dispatch("access_time_committed", str(channel))
 
-            elapsed_time = timedelta_to_str(end_dt - start_dt)
+            elapsed_time = timedelta_to_str(end - start)
 
             embed = discord.Embed(
                 title="通話終了", description="", color=discord.Colour.blue())
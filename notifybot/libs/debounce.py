@@ -0,0 +1,87 @@
+import asyncio
+import logging
+from typing import (Awaitable, Callable, Dict, Generic, Hashable, Optional,
+                    Tuple, TypeVar)
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class PendingBuffer(Generic[K, V]):
+    """イベントを猶予時間だけメモリ上に保留するクラス
+
+    猶予時間内に同じキーで取り出されたイベントは破棄され、コールバックは呼ばれない\\
+    猶予時間が経過したイベントはタイマーによってコールバックへ渡されて確定する
+
+    Attributes:
+        grace_seconds (float): 保留する秒数
+        callback (Callable[[V], Awaitable[None]]): 保留が確定したときに呼ばれるコールバック
+    """
+
+    def __init__(self,
+                 grace_seconds: float,
+                 callback: Callable[[V], Awaitable[None]]) -> None:
+        self.grace_seconds: float = grace_seconds
+        self.callback: Callable[[V], Awaitable[None]] = callback
+        self._pending: Dict[K, Tuple[V, asyncio.Task]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._pending
+
+    def push(self, key: K, value: V) -> None:
+        """イベントを保留する
+
+        同じキーのイベントがすでに保留されている場合は、古いイベントを確定させずに置き換える
+
+        Args:
+            key (K): イベントのキー
+            value (V): 保留するイベント
+        """
+        self.pop(key)
+        task = asyncio.create_task(self._run(key))
+        self._pending[key] = (value, task)
+
+    def pop(self, key: K) -> Optional[V]:
+        """保留中のイベントを取り消して返す
+
+        Args:
+            key (K): イベントのキー
+
+        Returns:
+            Optional[V]: 保留されていたイベント. 保留されていない場合はNone
+        """
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return None
+
+        value, task = pending
+        task.cancel()
+        return value
+
+    async def flush(self) -> None:
+        """保留中のイベントを猶予時間を待たずにすべて確定させる
+
+        一つのコールバックが失敗しても、残りのイベントは確定させる
+        """
+        for key in list(self._pending):
+            value = self.pop(key)
+            if value is None:
+                continue
+            try:
+                await self.callback(value)
+            except Exception:
+                logger.exception(f"Failed to finalize pending event: {key}")
+
+    async def _run(self, key: K) -> None:
+        await asyncio.sleep(self.grace_seconds)
+        # コールバック実行中にpopで取り消されないように先に取り除く
+        value, _ = self._pending.pop(key)
+        try:
+            await self.callback(value)
+        except Exception:
+            logger.exception(f"Failed to finalize pending event: {key}")
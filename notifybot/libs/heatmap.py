@@ -1,11 +1,29 @@
 import calendar
+import io
 from datetime import date, datetime, timedelta
-from typing import Any, Iterable, Optional, Union
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.colors import ColorConverter, ListedColormap
+from matplotlib.figure import Figure
+from PIL import Image
+
+# 出力形式ごとのファイル拡張子
+FORMAT_EXTENSIONS: Dict[str, str] = {
+    "png": "png",
+    "palette-png": "png",
+    "webp": "webp",
+}
+
+# プリセットごとの画像サイズ(インチ)とDPI
+PRESETS: Dict[str, Tuple[Tuple[float, float], int]] = {
+    "small": ((12, 3), 72),
+    "default": ((16, 4), 100),
+    "large": ((16, 4), 150),
+}
 
 
 class KusaDataConverter:
@@ -198,5 +216,83 @@ class HeatMap:
         return ax
 
 
+def draw(data: pd.Series,
+         end_date: Optional[date] = None,
+         preset: str = "default") -> Image.Image:
+    """草画像を描画する
+
+    pyplotのグローバルな状態を使わないため、複数のスレッドから同時に呼び出せる
+
+    Args:
+        data (pandas.Series): 通話時間を格納したSeries
+        end_date (Optional[date], optional): 生成するデータの最終日. Defaults to None.
+        preset (str, optional): 画像サイズとDPIのプリセット. small, default, largeのいずれか. Defaults to "default".
+
+    Returns:
+        Image.Image: 描画したRGBA画像
+    """
+    figsize, dpi = PRESETS[preset]
+
+    hm = HeatMap(data, end_date=end_date)
+    fig = Figure(figsize=figsize, dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    hm.plot(vmin=0, vmax=max(data), linewidth=1, ax=ax)
+    canvas.draw()
+    return Image.frombuffer("RGBA", canvas.get_width_height(),
+                            canvas.buffer_rgba(), "raw", "RGBA", 0, 1)
+
+
+def encode(image: Image.Image, format: str = "png", colors: int = 16) -> bytes:
+    """描画した草画像を画像ファイルにエンコードする
+
+    pngとwebpは可逆圧縮で、webpの方がファイルサイズが小さい\\
+    草画像は連続的なカラーマップとアンチエイリアスで数百色を使うため、palette-pngは色数を減らす非可逆圧縮になる
+
+    Args:
+        image (Image.Image): drawで描画した画像
+        format (str, optional): 出力形式. png, palette-png, webpのいずれか. Defaults to "png".
+        colors (int, optional): palette-pngで使う色数. Defaults to 16.
+
+    Returns:
+        bytes: 画像ファイルのバイト列
+    """
+    if format not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Unknown format: {format}")
+
+    image = image.convert("RGB")
+    sio = io.BytesIO()
+    if format == "png":
+        image.save(sio, format="PNG")
+    elif format == "palette-png":
+        image = image.quantize(colors=colors, dither=Image.NONE)
+        image.save(sio, format="PNG", optimize=True)
+    else:
+        image.save(sio, format="WEBP", lossless=True, method=6)
+    return sio.getvalue()
+
+
+def render(data: pd.Series,
+           end_date: Optional[date] = None,
+           format: str = "png",
+           preset: str = "default",
+           colors: int = 16) -> bytes:
+    """草画像を描画して画像ファイルのバイト列を返す
+
+    Args:
+        data (pandas.Series): 通話時間を格納したSeries
+        end_date (Optional[date], optional): 生成するデータの最終日. Defaults to None.
+        format (str, optional): 出力形式. png, palette-png, webpのいずれか. Defaults to "png".
+        preset (str, optional): 画像サイズとDPIのプリセット. small, default, largeのいずれか. Defaults to "default".
+        colors (int, optional): palette-pngで使う色数. Defaults to 16.
+
+    Returns:
+        bytes: 画像ファイルのバイト列
+    """
+    if format not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Unknown format: {format}")
+    return encode(draw(data, end_date=end_date, preset=preset), format=format, colors=colors)
+
+
 def dt_to_str(dt: datetime) -> str:
     return dt.strftime('%Y-%m-%d')
@@ -0,0 +1,40 @@
+import asyncio
+import contextlib
+from typing import AsyncIterator, Dict, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+
+class KeyedLock(Generic[K]):
+    """キーごとに独立したasyncio.Lockを管理するクラス
+
+    同じキーの処理は一つずつ順番に実行され、異なるキーの処理は互いを待たずに並行して実行される\\
+    ロックは使用中の間だけ保持し、待っている処理がなくなったら破棄する
+    """
+
+    def __init__(self) -> None:
+        self._locks: Dict[K, asyncio.Lock] = {}
+        self._users: Dict[K, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @contextlib.asynccontextmanager
+    async def __call__(self, key: K) -> AsyncIterator[None]:
+        """キーに対応するロックを取得する
+
+        Args:
+            key (K): ロックのキー
+        """
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[key] -= 1
+            if self._users[key] == 0:
+                del self._users[key]
+                del self._locks[key]
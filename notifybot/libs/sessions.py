@@ -0,0 +1,107 @@
+import dataclasses
+import datetime
+from typing import Dict, List
+
+
+@dataclasses.dataclass
+class Participant:
+    """通話中のメンバー
+
+    Attributes:
+        name (str): 表示名
+        joined_at (datetime.datetime): 入室時間
+    """
+    name: str
+    joined_at: datetime.datetime
+
+
+@dataclasses.dataclass
+class Session:
+    """一つのボイスチャンネルで進行中の通話
+
+    Attributes:
+        channel_id (int): チャンネルのID
+        channel_name (str): チャンネル名
+        started_at (datetime.datetime): 通話の開始時間
+        members (Dict[int, Participant]): メンバーのIDごとの通話中のメンバー
+    """
+    channel_id: int
+    channel_name: str
+    started_at: datetime.datetime
+    members: Dict[int, Participant] = dataclasses.field(default_factory=dict)
+
+
+class SessionTracker:
+    """進行中の通話をメモリ上で管理するクラス
+
+    データベースを参照せずに、現在どのチャンネルで誰が通話しているかを返す
+    """
+
+    def __init__(self) -> None:
+        self._sessions: Dict[int, Session] = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def enter(self, channel_id: int, channel_name: str, member_id: int, member_name: str, now: datetime.datetime) -> None:
+        """メンバーの入室を記録する
+
+        Args:
+            channel_id (int): チャンネルのID
+            channel_name (str): チャンネル名
+            member_id (int): メンバーのID
+            member_name (str): メンバーの表示名
+            now (datetime.datetime): 入室時間
+        """
+        session = self._sessions.get(channel_id)
+        if session is None:
+            session = self._sessions[channel_id] = Session(
+                channel_id, channel_name, now)
+        session.channel_name = channel_name
+        if member_id not in session.members:
+            session.members[member_id] = Participant(member_name, now)
+
+    def exit(self, channel_id: int, member_id: int) -> None:
+        """メンバーの退室を記録する
+
+        全員退室したチャンネルの通話は破棄する
+
+        Args:
+            channel_id (int): チャンネルのID
+            member_id (int): メンバーのID
+        """
+        session = self._sessions.get(channel_id)
+        if session is None:
+            return
+        session.members.pop(member_id, None)
+        if not session.members:
+            del self._sessions[channel_id]
+
+    def sync(self, channel_id: int, channel_name: str, members: Dict[int, str], now: datetime.datetime) -> None:
+        """チャンネルにいるメンバーをDiscordの状態に合わせる
+
+        起動時や再接続時に取りこぼしたイベントを反映するために使う\\
+        すでに記録されているメンバーの入室時間はそのまま残す
+
+        Args:
+            channel_id (int): チャンネルのID
+            channel_name (str): チャンネル名
+            members (Dict[int, str]): チャンネルにいるメンバーのIDと表示名
+            now (datetime.datetime): 新しく見つかったメンバーの入室時間として使う時間
+        """
+        session = self._sessions.get(channel_id)
+        if session is not None:
+            for member_id in list(session.members):
+                if member_id not in members:
+                    self.exit(channel_id, member_id)
+        for member_id, member_name in members.items():
+            self.enter(channel_id, channel_name, member_id, member_name, now)
+
+    def snapshot(self) -> List[Session]:
+        """進行中の通話を開始時間順に返す
+
+        Returns:
+            List[Session]: 進行中の通話のコピー
+        """
+        return sorted((dataclasses.replace(s, members=dict(s.members)) for s in self._sessions.values()),
+                      key=lambda s: s.started_at)
@@ -1,15 +1,15 @@
 import datetime
 import logging
-import os
-import re
-import sqlite3
 import traceback
+from typing import Optional
 
 import aiohttp
 import discord
 from discord.ext import commands
 
-from .cogs import HeatMapCog, VoiceNotificationCog
+from .cogs import HeatMapCog, StatusCog, VoiceNotificationCog
+from .libs.sessions import SessionTracker
+from .storage import Storage, create_storage
 from .vars import Data
 
 logger = logging.getLogger(__name__)
@@ -20,7 +20,14 @@ class NotifyBot(commands.Bot):
 
     全体のエラーをdiscordのerrorチャンネルに通知する
 
+    Attributes:
+        storage (Optional[Storage]): 終了時に閉じるストレージ
     """
+
+    def __init__(self, *args, storage: Optional[Storage] = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.storage = storage
+
     async def on_error(self, event_method: str, *args, **kwargs):
         if Data.ERROR_NOTIFY_INCOMING_WEBHOOK_URL is None:
             await super().on_error(event_method, *args, **kwargs)
@@ -32,6 +39,17 @@ class NotifyBot(commands.Bot):
             await webhook.send("[{}] Exception is occured in {} ```{}```".format(now, event_method, traceback.format_exc()))
         await super().on_error(event_method, *args, **kwargs)
 
+    async def close(self):
+        # 保留中の退室を記録してからストレージを閉じて終了する
+        try:
+            cog = self.get_cog(VoiceNotificationCog.__name__)
+            if cog is not None:
+                await cog.close()
+            if self.storage is not None:
+                await self.storage.close()
+        finally:
+            await super().close()
+
     async def on_command_error(self, ctx: discord.ext.commands.Context, ex: Exception):
         if Data.ERROR_NOTIFY_INCOMING_WEBHOOK_URL is None:
             await super().on_command_error(ctx, ex)
@@ -47,41 +65,22 @@ class NotifyBot(commands.Bot):
         await super().on_command_error(ctx, ex)
 
 
-async def db_init(notify_channel):
-    """データベースの初期化"""
-
-    TIME_FIELD_PATTERN = r"(\d{2}):(\d{2}):(\d{2})"
-    if os.path.exists(Data.DB_NAME):
-        logger.info("DB exists.")
-        return
-
-    time_field_pattern = re.compile(TIME_FIELD_PATTERN)
-
-    con = sqlite3.connect(Data.DB_NAME)
-    cur = con.cursor()
-
-    cur.execute(f"""CREATE TABLE {Data.VC_HISTORY_TABLE_NAME}
-                    (user_id int unsigned not null, channel text unsigned not null, access_datetime datetime not null, is_entering boolean)""")
-    cur.execute(f"""CREATE TABLE {Data.ACCESS_TIME_TABLE}
-                    (start datetime not null, end datetime not null, channel text unsigned not null)""")
-
-    con.commit()
-    con.close()
-
-    logger.info("DB is initialized.")
-
-
 def main():
     intents = discord.Intents.default()
     intents.members = True
     intents.reactions = True
 
-    bot = NotifyBot(intents=intents)
+    storage = create_storage()
+    bot = NotifyBot(intents=intents, storage=storage)
+    sessions = SessionTracker()
 
     @bot.event
     async def on_ready():
-        await db_init(bot.get_channel(Data.NOTIFY_CHANNEL_ID))
+        await storage.init()
+        logger.info("DB is initialized.")
+        bot.dispatch("storage_ready")
 
-    bot.add_cog(VoiceNotificationCog(bot))
-    bot.add_cog(HeatMapCog(bot))
+    bot.add_cog(VoiceNotificationCog(bot, storage, sessions))
+    bot.add_cog(HeatMapCog(bot, storage))
+    bot.add_cog(StatusCog(bot, sessions))
     bot.run(Data.TOKEN)
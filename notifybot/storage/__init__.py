@@ -0,0 +1,17 @@
+from ..vars import Data
+from .base import Storage
+from .mysql import MySQLStorage
+from .sqlite import SQLiteStorage
+
+
+def create_storage() -> Storage:
+    """設定されたバックエンドのストレージを作成する
+
+    Returns:
+        Storage: `Data.DB_BACKEND`に対応するストレージ
+    """
+    if Data.DB_BACKEND == "sqlite":
+        return SQLiteStorage()
+    if Data.DB_BACKEND == "mysql":
+        return MySQLStorage()
+    raise ValueError(f"Unknown DB_BACKEND: {Data.DB_BACKEND}")
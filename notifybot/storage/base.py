@@ -0,0 +1,103 @@
+import abc
+import datetime
+from typing import List, Optional, Tuple
+
+# 通話記録が一度もないチャンネルの直近の通話終了時間として扱う日時
+EPOCH = datetime.datetime(2000, 1, 1)
+
+
+class Storage(abc.ABC):
+    """入退室履歴と通話時間を永続化するストレージのインターフェース
+
+    Cogはこのインターフェースを通してのみデータベースにアクセスする
+    """
+
+    @abc.abstractmethod
+    async def init(self) -> None:
+        """テーブルが存在しない場合に作成する"""
+
+    @abc.abstractmethod
+    async def close(self) -> None:
+        """ストレージが保持する接続を閉じる"""
+
+    @abc.abstractmethod
+    async def is_commitable(self, member_id: int, channel: str, is_enter: bool = True) -> bool:
+        """入退室イベントが記録可能かを返す
+
+        何らかの不具合で入室が記録されないまま退室履歴を記録すると、その後の入退室通知が行われなくなる\\
+        そのため退室イベント発火時に直前の履歴が入室かどうかを調べ、入室じゃない場合に退室時の処理をスキップする\\
+        同様の理由で入室イベント時にも直前の履歴が入室の場合は処理をスキップする
+
+        Args:
+            member_id (int): メンバーのID
+            channel (str): チャンネル
+            is_enter (bool): 入室イベントかどうか. Default is True
+
+        Returns:
+            bool: 入退室イベントが記録可能か
+        """
+
+    @abc.abstractmethod
+    async def is_already_entering(self, member_id: int, channel: str) -> bool:
+        """すでにチャンネルへ入室済みか
+
+        一度退出したチャンネルでの通話が終わる前に入室したとき、その入室記録を通知しない\\
+        最後の通話記録の終了時間より後に退室記録が存在するかどうかを返す
+
+        Args:
+            member_id (int): 入室したメンバーのID
+            channel (str): 入室したチャンネル
+
+        Returns:
+            bool: 退室記録が存在するか
+        """
+
+    @abc.abstractmethod
+    async def commit_history(self, member_id: int, channel: str, now: datetime.datetime, is_entering: bool) -> None:
+        """入退室記録を追加する
+
+        Args:
+            member_id (int): メンバーのID
+            channel (str): チャンネル名
+            now (datetime.datetime): 記録時間
+            is_entering (bool): 入室かどうか
+        """
+
+    @abc.abstractmethod
+    async def is_all_member_exited_from(self, channel: str) -> bool:
+        """チャンネルから全員退室したか
+
+        チャンネルに誰か入ってから全員抜けるまでを通話時間とする\\
+        直近の通話記録の終了時間より後の入室記録と退室記録の数を比較して、一致するかどうかを返す\\
+        入室記録と退出記録の数が同じとき、全員そのチャンネルから退出したと判断する
+
+        Args:
+            channel (str): チャンネル名
+
+        Return:
+            bool: 全員退出したか
+        """
+
+    @abc.abstractmethod
+    async def commit_access_time(self, channel: str) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+        """通話時間を記録して開始終了時間を返す
+
+        入退室記録からそのチャンネルの最初の入室記録と最後の退出記録を通話時間を記録して、開始終了時間を返す\\
+        直近の通話記録より後に入退室記録がない場合(他のプロセスが先に記録した場合など)は何も記録しない
+
+        Args:
+            channel (str): チャンネル名
+        Return:
+            Optional[Tuple[datetime.datetime, datetime.datetime]]: 入室時間と退出時間. 記録しなかった場合はNone
+        """
+
+    @abc.abstractmethod
+    async def fetch_access_times(self, channel: Optional[str] = None) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+        """記録されている通話時間の一覧を返す
+
+        Args:
+            channel (Optional[str], optional): 絞り込むチャンネル名. Defaults to None.
+
+        Returns:
+            List[Tuple[datetime.datetime, datetime.datetime]]: 通話の開始時間と終了時間のリスト
+        """
@@ -0,0 +1,166 @@
+import asyncio
+import datetime
+from typing import Any, List, Optional, Tuple
+
+from ..vars import Data
+from .base import EPOCH, Storage
+
+
+class MySQLStorage(Storage):
+    """MySQL/MariaDBサーバーに記録するストレージ
+
+    aiomysqlのコネクションプールを使うため、複数のBotプロセスから同じデータベースを共有できる\\
+    aiomysqlはオプションの依存パッケージのため、このクラスを使うときだけimportする
+
+    Attributes:
+        host (str): サーバーのホスト名
+        port (int): サーバーのポート番号
+        user (str): ユーザー名
+        password (str): パスワード
+        db (str): データベース名
+        pool_size (int): コネクションプールの最大接続数
+    """
+
+    def __init__(self,
+                 host: str = Data.DB_HOST,
+                 port: int = Data.DB_PORT,
+                 user: str = Data.DB_USER,
+                 password: str = Data.DB_PASSWORD,
+                 db: str = Data.DB_DATABASE,
+                 pool_size: int = Data.DB_POOL_SIZE) -> None:
+        self.host: str = host
+        self.port: int = port
+        self.user: str = user
+        self.password: str = password
+        self.db: str = db
+        self.pool_size: int = pool_size
+        self._pool: Any = None
+        self._pool_lock = asyncio.Lock()
+
+    async def _get_pool(self) -> Any:
+        # 同時に呼ばれてもコネクションプールを一つだけ作成する
+        async with self._pool_lock:
+            if self._pool is None:
+                import aiomysql
+                self._pool = await aiomysql.create_pool(host=self.host,
+                                                        port=self.port,
+                                                        user=self.user,
+                                                        password=self.password,
+                                                        db=self.db,
+                                                        maxsize=self.pool_size,
+                                                        charset="utf8mb4",
+                                                        autocommit=True)
+        return self._pool
+
+    async def _fetchone(self, query: str, args: Any = None) -> Any:
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, args)
+                return await cur.fetchone()
+
+    async def _fetchall(self, query: str, args: Any = None) -> List[tuple]:
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, args)
+                return list(await cur.fetchall())
+
+    async def _execute(self, query: str, args: Any = None) -> None:
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, args)
+
+    async def init(self) -> None:
+        # チャンネル名はSQLiteと同じく大文字小文字を区別して比較する
+        await self._execute(f"""CREATE TABLE IF NOT EXISTS {Data.VC_HISTORY_TABLE_NAME}
+                                (user_id BIGINT UNSIGNED NOT NULL, channel VARCHAR(100) COLLATE utf8mb4_bin NOT NULL, access_datetime DATETIME(6) NOT NULL, is_entering BOOLEAN,
+                                 INDEX (channel, access_datetime)) DEFAULT CHARSET=utf8mb4""")
+        # 同じ通話を複数のプロセスが記録しないように、開始時間が同じ通話時間は一件だけにする
+        await self._execute(f"""CREATE TABLE IF NOT EXISTS {Data.ACCESS_TIME_TABLE}
+                                (`start` DATETIME(6) NOT NULL, `end` DATETIME(6) NOT NULL, channel VARCHAR(100) COLLATE utf8mb4_bin NOT NULL,
+                                 INDEX (channel, `end`), UNIQUE KEY (channel, `start`)) DEFAULT CHARSET=utf8mb4""")
+
+    async def close(self) -> None:
+        if self._pool is None:
+            return
+        self._pool.close()
+        await self._pool.wait_closed()
+        self._pool = None
+
+    async def is_commitable(self, member_id: int, channel: str, is_enter: bool = True) -> bool:
+        result = await self._fetchone(f"""SELECT is_entering FROM {Data.VC_HISTORY_TABLE_NAME}
+                                          WHERE user_id = %(user_id)s
+                                          AND channel = %(channel)s
+                                          ORDER BY access_datetime DESC
+                                          LIMIT 1""", {"user_id": member_id,
+                                                       "channel": channel})
+        if result is None:
+            return is_enter
+
+        return not (bool(result[0]) is is_enter)
+
+    async def is_already_entering(self, member_id: int, channel: str) -> bool:
+        result = await self._fetchone(f"""SELECT count(*) FROM {Data.VC_HISTORY_TABLE_NAME}
+                                          WHERE access_datetime > (SELECT COALESCE(MAX(`end`), %(epoch)s) FROM {Data.ACCESS_TIME_TABLE} WHERE channel = %(channel)s)
+                                          AND user_id = %(user_id)s
+                                          AND channel = %(channel)s
+                                          AND is_entering = 0""", {"user_id": member_id,
+                                                                   "channel": channel,
+                                                                   "epoch": EPOCH})
+        return bool(result[0])
+
+    async def commit_history(self, member_id: int, channel: str, now: datetime.datetime, is_entering: bool) -> None:
+        # SQLiteと同じくタイムゾーンを除いた時刻で記録する
+        await self._execute(f"""INSERT INTO {Data.VC_HISTORY_TABLE_NAME}(user_id, channel, access_datetime, is_entering)
+                                VALUES (%s, %s, %s, %s)""",
+                            (member_id, channel, now.replace(tzinfo=None), is_entering))
+
+    async def is_all_member_exited_from(self, channel: str) -> bool:
+        enter_count, exit_count = await self._fetchone(f"""SELECT
+                                                               COALESCE(SUM(is_entering = 1), 0),
+                                                               COALESCE(SUM(is_entering = 0), 0)
+                                                           FROM {Data.VC_HISTORY_TABLE_NAME}
+                                                           WHERE access_datetime > (SELECT COALESCE(MAX(`end`), %(epoch)s) FROM {Data.ACCESS_TIME_TABLE} WHERE channel = %(channel)s)
+                                                           AND channel = %(channel)s""", {"channel": channel,
+                                                                                          "epoch": EPOCH})
+        return enter_count == exit_count
+
+    async def commit_access_time(self, channel: str) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(f"""SELECT COALESCE(MAX(`end`), %(epoch)s) FROM {Data.ACCESS_TIME_TABLE}
+                                      WHERE channel = %(channel)s""", {"channel": channel, "epoch": EPOCH})
+                end = (await cur.fetchone())[0]
+
+                await cur.execute(f"""SELECT MIN(access_datetime) FROM {Data.VC_HISTORY_TABLE_NAME}
+                                      WHERE access_datetime > %(end)s
+                                      AND channel = %(channel)s
+                                      AND is_entering = 1""", {"channel": channel, "end": end})
+                first_enter_time = (await cur.fetchone())[0]
+                await cur.execute(f"""SELECT MAX(access_datetime) FROM {Data.VC_HISTORY_TABLE_NAME}
+                                      WHERE access_datetime > %(end)s
+                                      AND channel = %(channel)s
+                                      AND is_entering = 0""", {"channel": channel, "end": end})
+                last_exit_time = (await cur.fetchone())[0]
+                if first_enter_time is None or last_exit_time is None:
+                    return None
+
+                # 他のプロセスが先に同じ通話を記録した場合は一意制約で挿入されない
+                await cur.execute(f"""INSERT IGNORE INTO {Data.ACCESS_TIME_TABLE}(`start`, `end`, channel) VALUES (%s, %s, %s)""",
+                                  (first_enter_time, last_exit_time, channel))
+                if cur.rowcount == 0:
+                    return None
+
+        return first_enter_time, last_exit_time
+
+    async def fetch_access_times(self, channel: Optional[str] = None) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+        query = f"""SELECT `start`, `end` FROM {Data.ACCESS_TIME_TABLE}"""
+        query_kwargs = {}
+        if channel is not None:
+            query += "\nWHERE channel = %(channel)s"
+            query_kwargs["channel"] = channel
+
+        return [(start, end) for start, end in await self._fetchall(query, query_kwargs)]
@@ -0,0 +1,174 @@
+import asyncio
+import datetime
+import sqlite3
+from typing import List, Optional, Tuple
+
+from ..vars import Data
+from .base import EPOCH, Storage
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def _to_str(dt: datetime.datetime) -> str:
+    return dt.strftime(DATETIME_FORMAT)
+
+
+def _to_datetime(value: str) -> datetime.datetime:
+    # 小数秒がない記録も読めるようにfromisoformatを使う
+    return datetime.datetime.fromisoformat(value)
+
+
+class SQLiteStorage(Storage):
+    """SQLiteのファイルに記録するストレージ
+
+    sqlite3は同期APIのため、クエリはスレッドで実行してイベントループを止めないようにする
+
+    Attributes:
+        db_name (str): データベースファイルのパス
+    """
+
+    def __init__(self, db_name: str = Data.DB_NAME) -> None:
+        self.db_name: str = db_name
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_name)
+
+    async def init(self) -> None:
+        await asyncio.to_thread(self._init)
+
+    def _init(self) -> None:
+        con = self._connect()
+        cur = con.cursor()
+        cur.execute(f"""CREATE TABLE IF NOT EXISTS {Data.VC_HISTORY_TABLE_NAME}
+                        (user_id int unsigned not null, channel text unsigned not null, access_datetime datetime not null, is_entering boolean)""")
+        cur.execute(f"""CREATE TABLE IF NOT EXISTS {Data.ACCESS_TIME_TABLE}
+                        (start datetime not null, end datetime not null, channel text unsigned not null)""")
+        con.commit()
+        con.close()
+
+    async def close(self) -> None:
+        # 接続はクエリごとに開閉しているため保持している接続はない
+        pass
+
+    async def is_commitable(self, member_id: int, channel: str, is_enter: bool = True) -> bool:
+        return await asyncio.to_thread(self._is_commitable, member_id, channel, is_enter)
+
+    def _is_commitable(self, member_id: int, channel: str, is_enter: bool) -> bool:
+        con = self._connect()
+        cur = con.cursor()
+        cur.execute(f"""SELECT is_entering FROM {Data.VC_HISTORY_TABLE_NAME}
+                        WHERE user_id = :user_id
+                        AND channel = :channel
+                        ORDER BY access_datetime DESC
+                        LIMIT 1""", {"user_id": member_id,
+                                     "channel": channel})
+        result = cur.fetchone()
+        con.close()
+        if result is None:
+            return is_enter
+
+        return not (bool(result[0]) is is_enter)
+
+    async def is_already_entering(self, member_id: int, channel: str) -> bool:
+        return await asyncio.to_thread(self._is_already_entering, member_id, channel)
+
+    def _is_already_entering(self, member_id: int, channel: str) -> bool:
+        con = self._connect()
+        cur = con.cursor()
+        cur.execute(f"""SELECT count(*) FROM {Data.VC_HISTORY_TABLE_NAME}
+                        WHERE access_datetime > (SELECT COALESCE(MAX(end), :epoch) FROM {Data.ACCESS_TIME_TABLE} WHERE channel = :channel)
+                        AND user_id = :user_id
+                        AND channel = :channel
+                        AND is_entering = 0""", {"user_id": member_id,
+                                                 "channel": channel,
+                                                 "epoch": _to_str(EPOCH)})
+        is_exist = cur.fetchone()[0]
+        con.close()
+
+        return bool(is_exist)
+
+    async def commit_history(self, member_id: int, channel: str, now: datetime.datetime, is_entering: bool) -> None:
+        await asyncio.to_thread(self._commit_history, member_id, channel, now, is_entering)
+
+    def _commit_history(self, member_id: int, channel: str, now: datetime.datetime, is_entering: bool) -> None:
+        con = self._connect()
+        cur = con.cursor()
+        cur.execute(
+            f"INSERT INTO {Data.VC_HISTORY_TABLE_NAME}(user_id, channel, access_datetime, is_entering) VALUES (?,?,?,?)",
+            (member_id, channel, _to_str(now), is_entering))
+        con.commit()
+        con.close()
+
+    async def is_all_member_exited_from(self, channel: str) -> bool:
+        return await asyncio.to_thread(self._is_all_member_exited_from, channel)
+
+    def _is_all_member_exited_from(self, channel: str) -> bool:
+        con = self._connect()
+        cur = con.cursor()
+        cur.execute(f"""SELECT
+                            COALESCE(SUM(is_entering = 1), 0),
+                            COALESCE(SUM(is_entering = 0), 0)
+                        FROM {Data.VC_HISTORY_TABLE_NAME}
+                        WHERE access_datetime > (SELECT COALESCE(MAX(end), :epoch) FROM {Data.ACCESS_TIME_TABLE} WHERE channel = :channel)
+                        AND channel = :channel""", {"channel": channel,
+                                                    "epoch": _to_str(EPOCH)})
+        enter_count, exit_count = cur.fetchone()
+        con.close()
+
+        return enter_count == exit_count
+
+    async def commit_access_time(self, channel: str) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+        return await asyncio.to_thread(self._commit_access_time, channel)
+
+    def _commit_access_time(self, channel: str) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+        con = self._connect()
+        cur = con.cursor()
+        cur.execute(f"""SELECT end FROM {Data.ACCESS_TIME_TABLE} WHERE channel = :channel ORDER BY end DESC LIMIT 1""", {
+                    "channel": channel})
+        end = cur.fetchone()
+        if end is None:
+            end = _to_str(EPOCH)
+        else:
+            end = end[0]
+
+        cur.execute(f"""SELECT access_datetime FROM {Data.VC_HISTORY_TABLE_NAME}
+                        WHERE access_datetime > :end
+                        AND channel = :channel
+                        AND is_entering = 1
+                        ORDER BY access_datetime LIMIT 1""", {"channel": channel, "end": end})
+        first_enter = cur.fetchone()
+        cur.execute(f"""SELECT access_datetime FROM {Data.VC_HISTORY_TABLE_NAME}
+                        WHERE access_datetime > :end
+                        AND channel = :channel
+                        AND is_entering = 0
+                        ORDER BY access_datetime DESC LIMIT 1""", {"channel": channel, "end": end})
+        last_exit = cur.fetchone()
+        if first_enter is None or last_exit is None:
+            con.close()
+            return None
+
+        first_enter_time, last_exit_time = first_enter[0], last_exit[0]
+        cur.execute(f"""INSERT INTO {Data.ACCESS_TIME_TABLE}(start, end, channel) VALUES (?,?,?)""",
+                    (first_enter_time, last_exit_time, channel))
+        con.commit()
+        con.close()
+
+        return _to_datetime(first_enter_time), _to_datetime(last_exit_time)
+
+    async def fetch_access_times(self, channel: Optional[str] = None) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+        return await asyncio.to_thread(self._fetch_access_times, channel)
+
+    def _fetch_access_times(self, channel: Optional[str]) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+        con = self._connect()
+        cur = con.cursor()
+        query = f"""SELECT start, end FROM {Data.ACCESS_TIME_TABLE}"""
+        query_kwargs = {}
+        if channel is not None:
+            query += "\nWHERE channel = :channel"
+            query_kwargs["channel"] = channel
+
+        rows = [(_to_datetime(start), _to_datetime(end))
+                for start, end in cur.execute(query, query_kwargs)]
+        con.close()
+
+        return rows
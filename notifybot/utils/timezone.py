@@ -4,3 +4,15 @@ import datetime
 def tz_localize(dt: datetime.datetime):
     # 記録上ではUTCだがプログラム上ではJSTで認識されてしまうため
     return dt + datetime.timedelta(hours=9)
+
+
+def next_midnight(now: datetime.datetime) -> datetime.datetime:
+    """nowの翌日の0時を返す
+
+    Args:
+        now (datetime.datetime): タイムゾーン付きの現在時刻
+
+    Returns:
+        datetime.datetime: nowと同じタイムゾーンでの翌日の0時
+    """
+    return now.replace(hour=0, minute=0, second=0, microsecond=0) + datetime.timedelta(days=1)
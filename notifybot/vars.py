@@ -15,7 +15,15 @@ class Data:
     JST: tzinfo = pytz.timezone('Asia/Tokyo')
 
     # db
+    # "sqlite" または "mysql"
+    DB_BACKEND: str = os.getenv('DB_BACKEND', 'sqlite')
     DB_NAME: str = "voice-time.sqlite3"
+    DB_HOST: str = os.getenv('DB_HOST', 'localhost')
+    DB_PORT: int = int(os.getenv('DB_PORT', '3306'))
+    DB_USER: str = os.getenv('DB_USER', 'notifybot')
+    DB_PASSWORD: str = os.getenv('DB_PASSWORD', '')
+    DB_DATABASE: str = os.getenv('DB_DATABASE', 'notifybot')
+    DB_POOL_SIZE: int = int(os.getenv('DB_POOL_SIZE', '10'))
     VC_HISTORY_TABLE_NAME: str = "vc_access_history"
     ACCESS_TIME_TABLE: str = "access_time"
 
@@ -29,3 +37,25 @@ class Data:
     # optional
     ERROR_NOTIFY_INCOMING_WEBHOOK_URL: Optional[str] = os.getenv(
         'ERROR_NOTIFY_INCOMING_WEBHOOK_URL')
+    # 退室から再入室までをひとつの通話とみなす猶予秒数 (0で無効)
+    EXIT_GRACE_SECONDS: float = float(os.getenv('EXIT_GRACE_SECONDS', '10'))
+    # ピン留めした通話状況のメッセージを編集する最短の間隔(秒)
+    STATUS_UPDATE_INTERVAL_SECONDS: float = float(
+        os.getenv('STATUS_UPDATE_INTERVAL_SECONDS', '30'))
+
+    # heatmap
+    # 0時を過ぎてから草画像の事前生成を始めるまでの秒数
+    HEATMAP_PRERENDER_DELAY_SECONDS: float = float(
+        os.getenv('HEATMAP_PRERENDER_DELAY_SECONDS', '60'))
+    # 通話が記録されてから草画像を再生成するまでの待機秒数
+    HEATMAP_IDLE_SECONDS: float = float(os.getenv('HEATMAP_IDLE_SECONDS', '300'))
+    # 草画像を同時に生成する最大数
+    HEATMAP_RENDER_CONCURRENCY: int = int(
+        os.getenv('HEATMAP_RENDER_CONCURRENCY', '2'))
+    # 草画像の出力形式 (png, palette-png, webp). palette-pngは色数を減らすため非可逆
+    HEATMAP_FORMAT: str = os.getenv('HEATMAP_FORMAT', 'webp')
+    # 草画像のサイズとDPIのプリセット (small, default, large)
+    HEATMAP_PRESET: str = os.getenv('HEATMAP_PRESET', 'default')
+    # palette-pngで使う色数 (少ないほど小さくなるが、近い通話時間のマスが同じ色になる)
+    HEATMAP_PALETTE_COLORS: int = int(
+        os.getenv('HEATMAP_PALETTE_COLORS', '16'))
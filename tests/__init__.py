@@ -0,0 +1,6 @@
+import os
+
+# notifybot.varsはimport時に必須の環境変数を読み込むため、テスト用の値を設定しておく
+os.environ.setdefault("TOKEN", "test-token")
+os.environ.setdefault("NOTIFY_CHANNEL_ID", "0")
+os.environ.setdefault("SERVER_ID", "0")
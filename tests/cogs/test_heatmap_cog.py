@@ -0,0 +1,122 @@
+import asyncio
+import datetime
+import unittest
+from unittest import mock
+
+from notifybot.cogs import HeatMapCog
+from notifybot.libs import heatmap
+from notifybot.vars import Data
+
+TODAY = datetime.date(2022, 3, 1)
+
+
+class FakeStorage:
+    def __init__(self):
+        self.fetch_count = 0
+        self.on_fetch = None
+
+    async def fetch_access_times(self, channel=None):
+        self.fetch_count += 1
+        if self.on_fetch is not None:
+            await self.on_fetch()
+        start = datetime.datetime(2022, 2, 28, 21, 0, 0)
+        return [(start, start + datetime.timedelta(hours=1))]
+
+
+class HeatMapCogCacheTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.storage = FakeStorage()
+        self.cog = HeatMapCog(mock.Mock(), self.storage)
+        self.addCleanup(self.cog.cog_unload)
+
+        self.render_count = 0
+
+        def render(*args, **kwargs):
+            self.render_count += 1
+            return b"image-%d" % self.render_count
+
+        patcher = mock.patch.object(heatmap, "render", side_effect=render)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_cache_hit(self):
+        self.assertEqual(await self.cog.prepare_heatmap(None, TODAY), b"image-1")
+        self.assertEqual(await self.cog.prepare_heatmap(None, TODAY), b"image-1")
+        self.assertEqual(self.render_count, 1)
+        self.assertEqual(self.storage.fetch_count, 1)
+
+        # 日付が変わったら生成し直す
+        tomorrow = TODAY + datetime.timedelta(days=1)
+        self.assertEqual(await self.cog.prepare_heatmap(None, tomorrow), b"image-2")
+
+    async def test_invalidate_on_access_time_committed(self):
+        await self.cog.prepare_heatmap(None, TODAY)
+        await self.cog.prepare_heatmap("general", TODAY)
+        await self.cog.prepare_heatmap("game", TODAY)
+        self.assertEqual(self.render_count, 3)
+
+        await self.cog.on_access_time_committed("general")
+        # 通話が記録されてしばらくしたら再生成する
+        self.assertIn("prerender", self.cog._idle_prerender)
+
+        self.assertEqual(await self.cog.prepare_heatmap(None, TODAY), b"image-4")
+        self.assertEqual(await self.cog.prepare_heatmap("general", TODAY), b"image-5")
+        # 通話が記録されていないチャンネルはキャッシュのまま
+        self.assertEqual(await self.cog.prepare_heatmap("game", TODAY), b"image-3")
+        self.assertEqual(self.render_count, 5)
+
+    async def test_invalidated_while_rendering(self):
+        # 集計中に新しい通話が記録された場合は、古い草画像をキャッシュしない
+        async def commit():
+            self.storage.on_fetch = None
+            await self.cog.on_access_time_committed("general")
+        self.storage.on_fetch = commit
+
+        self.assertEqual(await self.cog.prepare_heatmap("general", TODAY), b"image-1")
+        self.assertNotIn("general", self.cog.cache)
+        self.assertEqual(await self.cog.prepare_heatmap("general", TODAY), b"image-2")
+        self.assertEqual(await self.cog.prepare_heatmap("general", TODAY), b"image-2")
+
+    async def test_concurrent_requests_render_once(self):
+        # 生成中の草画像を要求した場合は同じ生成を待つ
+        results = await asyncio.gather(*(self.cog.prepare_heatmap("general", TODAY) for _ in range(5)))
+        self.assertEqual(results, [b"image-1"] * 5)
+        self.assertEqual(self.render_count, 1)
+        self.assertEqual(self.storage.fetch_count, 1)
+        self.assertEqual(self.cog.rendering, {})
+
+
+class KusaCommandTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.storage = FakeStorage()
+        self.cog = HeatMapCog(mock.Mock(), self.storage)
+        self.addCleanup(self.cog.cog_unload)
+        self.ctx = mock.Mock()
+        self.ctx.defer = mock.AsyncMock()
+        self.ctx.respond = mock.AsyncMock()
+        self.cog.guild = self.ctx.guild
+
+        patcher = mock.patch.object(heatmap, "render", return_value=b"image")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def kusa(self):
+        await self.cog.kusa.callback(self.cog, self.ctx, None)
+
+    async def test_defer_on_cache_miss(self):
+        await self.kusa()
+        self.ctx.defer.assert_awaited_once()
+        self.ctx.respond.assert_awaited_once()
+
+        # キャッシュがある場合はすぐに応答する
+        self.ctx.defer.reset_mock()
+        await self.kusa()
+        self.ctx.defer.assert_not_awaited()
+        self.assertEqual(self.ctx.respond.await_count, 2)
+
+    async def test_not_queued_behind_prerender(self):
+        # 事前生成で同時生成数が埋まっていても/kusaは待たされない
+        for _ in range(Data.HEATMAP_RENDER_CONCURRENCY):
+            await self.cog._render_semaphore.acquire()
+        await asyncio.wait_for(self.kusa(), timeout=1)
+        self.ctx.respond.assert_awaited_once()
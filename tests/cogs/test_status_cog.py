@@ -0,0 +1,138 @@
+import asyncio
+import datetime
+import time
+import unittest
+from unittest import mock
+
+import discord
+
+from notifybot.cogs import StatusCog, status_cog
+from notifybot.libs.sessions import SessionTracker
+
+JST = datetime.timezone(datetime.timedelta(hours=9))
+BASE = datetime.datetime(2022, 3, 1, 21, 0, 0, tzinfo=JST)
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+        self.editing = None
+
+    async def edit(self, embed):
+        if self.editing is not None:
+            await self.editing.wait()
+        self.edits.append((time.monotonic(), embed))
+
+
+def assert_within_limits(test: unittest.TestCase, embed: discord.Embed) -> None:
+    test.assertLessEqual(len(embed.fields), status_cog.EMBED_MAX_FIELDS)
+    for field in embed.fields:
+        test.assertLessEqual(len(field.name), status_cog.EMBED_MAX_FIELD_NAME)
+        test.assertLessEqual(len(field.value), status_cog.EMBED_MAX_FIELD_VALUE)
+    test.assertLessEqual(len(embed), status_cog.EMBED_MAX_TOTAL)
+
+
+class CreateStatusEmbedTest(unittest.TestCase):
+    def test_relative_timestamp(self):
+        # 経過時間はクライアント側で更新されるタイムスタンプで表示する
+        sessions = SessionTracker()
+        sessions.enter(1, "general", 100, "alice", BASE)
+        embed = status_cog.create_status_embed(sessions, BASE + datetime.timedelta(minutes=5))
+        self.assertEqual(embed.fields[0].name, "`general`")
+        self.assertEqual(embed.fields[0].value,
+                         f"開始: <t:{int(BASE.timestamp())}:R>\naliceさん (<t:{int(BASE.timestamp())}:R>)")
+
+    def test_clamp_members(self):
+        sessions = SessionTracker()
+        for i in range(50):
+            sessions.enter(1, "general", i, "m" * 32, BASE)
+        embed = status_cog.create_status_embed(sessions, BASE)
+        assert_within_limits(self, embed)
+        value = embed.fields[0].value
+        self.assertTrue(value.endswith(f"…他{50 - value.count('さん')}人"))
+
+    def test_clamp_channels(self):
+        # 全体の文字数とフィールド数も上限に収める
+        sessions = SessionTracker()
+        for channel in range(40):
+            for member in range(50):
+                sessions.enter(channel, "c" * 100 + str(channel), channel * 100 + member, "m" * 32, BASE)
+        embed = status_cog.create_status_embed(sessions, BASE)
+        assert_within_limits(self, embed)
+        self.assertEqual(embed.fields[-1].name, f"他{40 - status_cog.EMBED_MAX_FIELDS + 1}チャンネル")
+
+
+class StatusCogTest(unittest.IsolatedAsyncioTestCase):
+    INTERVAL = 0.05
+
+    async def asyncSetUp(self):
+        self.sessions = SessionTracker()
+        self.cog = StatusCog(mock.Mock(), self.sessions, update_interval=self.INTERVAL)
+        self.addCleanup(self.cog.cog_unload)
+        self.cog.status_message = FakeMessage()
+
+    async def wait_idle(self):
+        while self.cog._update_task is not None and not self.cog._update_task.done():
+            await asyncio.sleep(self.INTERVAL / 5)
+
+    async def test_edit_at_most_once_per_interval(self):
+        start = time.monotonic()
+        for i in range(1000):
+            self.sessions.enter(1, "general", i, f"member-{i}", BASE)
+            await self.cog.on_voice_session_update()
+            if i % 100 == 0:
+                await asyncio.sleep(self.INTERVAL / 4)
+        elapsed = time.monotonic() - start
+        await self.wait_idle()
+
+        edits = self.cog.status_message.edits
+        self.assertGreaterEqual(len(edits), 1)
+        self.assertLessEqual(len(edits), elapsed / self.INTERVAL + 2)
+        for (before, _), (after, _) in zip(edits, edits[1:]):
+            self.assertGreaterEqual(after - before, self.INTERVAL * 0.9)
+
+        # 最後の編集には全員が反映され、Embedの上限に収まるように省略されている
+        _, embed = edits[-1]
+        value = embed.fields[0].value
+        self.assertLessEqual(len(value), status_cog.EMBED_MAX_FIELD_VALUE)
+        shown = value.count("さん")
+        self.assertGreater(shown, 0)
+        self.assertTrue(value.endswith(f"…他{1000 - shown}人"))
+
+    async def test_event_during_edit_is_not_lost(self):
+        self.sessions.enter(1, "general", 100, "alice", BASE)
+        await self.cog.on_voice_session_update()
+
+        message = self.cog.status_message
+        message.editing = asyncio.Event()
+        await asyncio.sleep(self.INTERVAL * 1.5)
+
+        # 編集中にメンバーが退室する
+        self.sessions.exit(1, 100)
+        await self.cog.on_voice_session_update()
+        message.editing.set()
+        await self.wait_idle()
+
+        self.assertEqual(len(message.edits), 2)
+        _, embed = message.edits[-1]
+        self.assertEqual(embed.description, "通話中のチャンネルはありません")
+
+    async def test_missing_permission_to_pin(self):
+        # ピン留めの権限がなくてもメッセージを送信して更新を続ける
+        forbidden = discord.Forbidden(mock.Mock(status=403, reason="Forbidden"), "Missing Permissions")
+        message = FakeMessage()
+        message.pin = mock.AsyncMock(side_effect=forbidden)
+        channel = mock.Mock()
+        channel.pins = mock.AsyncMock(side_effect=forbidden)
+        channel.send = mock.AsyncMock(return_value=message)
+        self.cog.bot.get_channel.return_value = channel
+        self.cog.status_message = None
+
+        with self.assertLogs("notifybot.cogs.status_cog", level="WARNING"):
+            await self.cog.on_ready()
+        self.assertIs(self.cog.status_message, message)
+
+        self.sessions.enter(1, "general", 100, "alice", BASE)
+        await self.cog.on_voice_session_update()
+        await self.wait_idle()
+        self.assertEqual(len(message.edits), 1)
@@ -0,0 +1,203 @@
+import asyncio
+import datetime
+import os
+import random
+import sqlite3
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from notifybot.cogs import VoiceNotificationCog
+from notifybot.libs.sessions import SessionTracker
+from notifybot.storage import SQLiteStorage
+
+JST = datetime.timezone(datetime.timedelta(hours=9))
+BASE = datetime.datetime(2022, 3, 1, 0, 0, 0, tzinfo=JST)
+
+
+class FakeMember(SimpleNamespace):
+    def __str__(self):
+        return self.display_name
+
+
+class FakeChannel(SimpleNamespace):
+    def __str__(self):
+        return self.name
+
+
+class FakeNotifyChannel:
+    def __init__(self):
+        self.embeds = []
+
+    async def send(self, embed):
+        # 通知中に他のイベントが割り込めるようにする
+        await asyncio.sleep(0)
+        self.embeds.append(embed)
+
+
+class FakeBot:
+    def dispatch(self, event_name, *args):
+        pass
+
+
+class VoiceNotificationCogStressTest(unittest.IsolatedAsyncioTestCase):
+    CHANNELS = 20
+    MEMBERS = 10
+    ROUNDS = 5
+
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.storage = SQLiteStorage(os.path.join(self.tmpdir.name, "test.sqlite3"))
+        await self.storage.init()
+
+        self.cog = VoiceNotificationCog(FakeBot(), self.storage, SessionTracker(),
+                                        exit_grace_seconds=0)
+        self.cog.notify_channel = FakeNotifyChannel()
+
+        guild = SimpleNamespace(id=1)
+        self.channels = [FakeChannel(id=100 + i, name=f"vc-{i}", guild=guild)
+                         for i in range(self.CHANNELS)]
+        self.members = [FakeMember(id=1000 + i, display_name=f"member-{i}",
+                                   display_avatar=SimpleNamespace(url=""))
+                        for i in range(self.MEMBERS)]
+
+    async def run_channel(self, channel):
+        for r in range(self.ROUNDS):
+            round_start = BASE + datetime.timedelta(hours=r)
+            round_end = round_start + datetime.timedelta(minutes=30)
+
+            # 同じチャンネルの入室・退室イベントを順不同で同時に発火する
+            enters = [self.cog.enter(m, channel, round_start + datetime.timedelta(seconds=i))
+                      for i, m in enumerate(self.members)]
+            random.shuffle(enters)
+            await asyncio.gather(*enters)
+
+            exits = [self.cog.exit(m, channel, round_end + datetime.timedelta(seconds=i))
+                     for i, m in enumerate(self.members)]
+            random.shuffle(exits)
+            await asyncio.gather(*exits)
+
+    async def test_concurrent_events(self):
+        await asyncio.gather(*(self.run_channel(c) for c in self.channels))
+
+        for channel in self.channels:
+            rows = sorted(await self.storage.fetch_access_times(channel.name))
+            expected = []
+            for r in range(self.ROUNDS):
+                round_start = BASE + datetime.timedelta(hours=r)
+                round_end = round_start + datetime.timedelta(minutes=30,
+                                                             seconds=self.MEMBERS - 1)
+                expected.append((round_start.replace(tzinfo=None),
+                                 round_end.replace(tzinfo=None)))
+            self.assertEqual(rows, expected, channel.name)
+
+        # 入室は一人ずつ、終了は通話ごとに一回だけ通知される
+        titles = [embed.title for embed in self.cog.notify_channel.embeds]
+        self.assertEqual(titles.count("通話開始"),
+                         self.CHANNELS * self.ROUNDS * self.MEMBERS)
+        self.assertEqual(titles.count("通話終了"), self.CHANNELS * self.ROUNDS)
+        self.assertEqual(len(self.cog.channel_locks), 0)
+        self.assertEqual(len(self.cog.sessions), 0)
+
+
+class VoiceNotificationCogGraceTest(unittest.IsolatedAsyncioTestCase):
+    GRACE_SECONDS = 0.05
+
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.db_name = os.path.join(self.tmpdir.name, "test.sqlite3")
+        self.storage = SQLiteStorage(self.db_name)
+        await self.storage.init()
+
+        self.cog = VoiceNotificationCog(FakeBot(), self.storage, SessionTracker(),
+                                        exit_grace_seconds=self.GRACE_SECONDS)
+        self.cog.notify_channel = FakeNotifyChannel()
+
+        self.channel = FakeChannel(id=100, name="vc", guild=SimpleNamespace(id=1))
+        self.member = FakeMember(id=1000, display_name="member",
+                                 display_avatar=SimpleNamespace(url=""))
+
+    def history_count(self):
+        con = sqlite3.connect(self.db_name)
+        count = con.execute("SELECT count(*) FROM vc_access_history").fetchone()[0]
+        con.close()
+        return count
+
+    def titles(self):
+        return [embed.title for embed in self.cog.notify_channel.embeds]
+
+    async def test_reconnect_within_grace(self):
+        await self.cog.enter(self.member, self.channel, BASE)
+        self.assertEqual(self.history_count(), 1)
+
+        # 猶予時間内の退室と再入室は記録も通知もされない
+        await self.cog.exit(self.member, self.channel, BASE + datetime.timedelta(seconds=1))
+        await self.cog.enter(self.member, self.channel, BASE + datetime.timedelta(seconds=2))
+        await asyncio.sleep(self.GRACE_SECONDS * 3)
+
+        self.assertEqual(self.history_count(), 1)
+        self.assertEqual(self.titles(), ["通話開始"])
+        self.assertFalse(await self.storage.is_commitable(self.member.id, "vc"))
+
+    async def test_exit_after_grace(self):
+        await self.cog.enter(self.member, self.channel, BASE)
+        await self.cog.exit(self.member, self.channel, BASE + datetime.timedelta(minutes=1))
+        self.assertEqual(self.history_count(), 1)
+
+        # 猶予時間が過ぎると退室時間で記録・通知される
+        await asyncio.sleep(self.GRACE_SECONDS * 3)
+        self.assertEqual(self.history_count(), 2)
+        self.assertEqual(self.titles(), ["通話開始", "通話終了"])
+        self.assertEqual(await self.storage.fetch_access_times("vc"),
+                         [(BASE.replace(tzinfo=None),
+                           (BASE + datetime.timedelta(minutes=1)).replace(tzinfo=None))])
+
+    async def test_close_flushes_pending_exits(self):
+        await self.cog.enter(self.member, self.channel, BASE)
+        await self.cog.exit(self.member, self.channel, BASE + datetime.timedelta(minutes=1))
+
+        await self.cog.close()
+        self.assertEqual(self.history_count(), 2)
+        self.assertEqual(self.titles(), ["通話開始", "通話終了"])
+
+    async def test_reconnect_while_channel_is_locked(self):
+        await self.cog.enter(self.member, self.channel, BASE)
+        await self.cog.exit(self.member, self.channel, BASE + datetime.timedelta(seconds=1))
+
+        # 他のイベントがチャンネルのロックを持っている間に、猶予時間の終わる直前で再入室する
+        async def hold_lock():
+            async with self.cog.channel_locks((1, self.channel.id)):
+                await asyncio.sleep(self.GRACE_SECONDS * 2)
+
+        holder = asyncio.create_task(hold_lock())
+        await asyncio.sleep(self.GRACE_SECONDS * 0.6)
+        await asyncio.gather(holder,
+                             self.cog.enter(self.member, self.channel, BASE + datetime.timedelta(seconds=2)))
+        await asyncio.sleep(self.GRACE_SECONDS * 3)
+
+        self.assertEqual(self.history_count(), 1)
+        self.assertEqual(self.titles(), ["通話開始"])
+        self.assertFalse(await self.storage.is_commitable(self.member.id, "vc"))
+        session, = self.cog.sessions.snapshot()
+        self.assertIn(self.member.id, session.members)
+
+    async def test_reenter_after_grace_waits_for_exit(self):
+        await self.cog.enter(self.member, self.channel, BASE)
+        await self.cog.exit(self.member, self.channel, BASE + datetime.timedelta(seconds=1))
+
+        # 猶予時間が過ぎて退室の確定がロックを待っている間に再入室する
+        async with self.cog.channel_locks((1, self.channel.id)):
+            await asyncio.sleep(self.GRACE_SECONDS * 2)
+            self.assertNotIn((self.member.id, self.channel.id), self.cog.pending_exits)
+            enter = asyncio.create_task(
+                self.cog.enter(self.member, self.channel, BASE + datetime.timedelta(minutes=1)))
+            await asyncio.sleep(0)
+        await enter
+
+        # 退室と再入室が順番に記録され、メンバーは通話中のまま
+        self.assertEqual(self.history_count(), 3)
+        self.assertFalse(await self.storage.is_commitable(self.member.id, "vc"))
+        session, = self.cog.sessions.snapshot()
+        self.assertIn(self.member.id, session.members)
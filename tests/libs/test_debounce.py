@@ -0,0 +1,52 @@
+import asyncio
+import unittest
+
+from notifybot.libs import debounce
+
+
+class PendingBufferTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.finalized = []
+
+        async def callback(value):
+            self.finalized.append(value)
+
+        self.buffer = debounce.PendingBuffer(0.05, callback)
+
+    async def test_finalize_after_grace(self):
+        self.buffer.push("key", "exit")
+        self.assertIn("key", self.buffer)
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.finalized, ["exit"])
+        self.assertEqual(len(self.buffer), 0)
+
+    async def test_pop_within_grace(self):
+        # 猶予時間内に取り出したイベントは確定しない
+        self.buffer.push("key", "exit")
+        self.assertEqual(self.buffer.pop("key"), "exit")
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.finalized, [])
+        self.assertIsNone(self.buffer.pop("key"))
+
+    async def test_flush(self):
+        self.buffer.push("a", 1)
+        self.buffer.push("b", 2)
+        await self.buffer.flush()
+        self.assertEqual(sorted(self.finalized), [1, 2])
+        await asyncio.sleep(0.1)
+        self.assertEqual(sorted(self.finalized), [1, 2])
+
+    async def test_flush_continues_after_failure(self):
+        # 一つのコールバックが失敗しても残りのイベントは確定する
+        async def callback(value):
+            if value == 1:
+                raise RuntimeError("send failed")
+            self.finalized.append(value)
+
+        self.buffer.callback = callback
+        self.buffer.push("a", 1)
+        self.buffer.push("b", 2)
+        with self.assertLogs("notifybot.libs.debounce", level="ERROR"):
+            await self.buffer.flush()
+        self.assertEqual(self.finalized, [2])
+        self.assertEqual(len(self.buffer), 0)
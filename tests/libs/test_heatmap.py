@@ -5,8 +5,9 @@ import unittest
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from notifybot.libs import heatmap
+from PIL import Image
 
+from notifybot.libs import heatmap
 
 np.random.seed(sum(map(ord, 'calmap')))
 
@@ -82,3 +83,45 @@ class HeatMapTest(unittest.TestCase):
         sio.seek(0)
         bline = sio.readline()
         self.assertTrue(bline.startswith(b'\x89PNG\r\n'))
+
+    def test_render(self):
+        # pyplotを使わずにpng形式のバイト列が生成されるか確認
+        all_days = pd.date_range(end='3/15/2021', periods=365, freq='D')
+        days = np.random.choice(all_days, 96, replace=False)
+        events = pd.Series(np.random.randint(0, 24, len(days)),
+                           index=days, dtype=np.int8)
+        data = heatmap.render(events, end_date=datetime.date(2021, 3, 15))
+        self.assertIsInstance(data, bytes)
+        self.assertTrue(data.startswith(b'\x89PNG\r\n'))
+
+    def test_render_formats(self):
+        all_days = pd.date_range(end='3/15/2021', periods=365, freq='D')
+        days = np.random.choice(all_days, 96, replace=False)
+        events = pd.Series(np.random.randint(0, 24, len(days)),
+                           index=days, dtype=np.int8)
+        end_date = datetime.date(2021, 3, 15)
+
+        png = heatmap.render(events, end_date=end_date)
+        palette_png = heatmap.render(
+            events, end_date=end_date, format="palette-png")
+        self.assertTrue(palette_png.startswith(b'\x89PNG\r\n'))
+        self.assertLess(len(palette_png), len(png))
+
+        webp = heatmap.render(events, end_date=end_date,
+                              format="webp", preset="small")
+        self.assertEqual(webp[:4], b'RIFF')
+        self.assertEqual(webp[8:12], b'WEBP')
+
+        with self.assertRaises(ValueError):
+            heatmap.render(events, end_date=end_date, format="gif")
+
+    def test_encode_lossless(self):
+        # pngとwebpは描画結果をそのまま復元できる
+        all_days = pd.date_range(end='3/15/2021', periods=365, freq='D')
+        days = np.random.choice(all_days, 96, replace=False)
+        events = pd.Series(np.random.rand(len(days)), index=days)
+        image = heatmap.draw(events, end_date=datetime.date(2021, 3, 15),
+                             preset="small").convert("RGB")
+        for format in ("png", "webp"):
+            decoded = Image.open(io.BytesIO(heatmap.encode(image, format=format)))
+            self.assertEqual(decoded.convert("RGB").tobytes(), image.tobytes(), format)
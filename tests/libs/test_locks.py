@@ -0,0 +1,38 @@
+import asyncio
+import unittest
+
+from notifybot.libs import locks
+
+
+class KeyedLockTest(unittest.IsolatedAsyncioTestCase):
+    async def test_same_key_is_serialized(self):
+        lock = locks.KeyedLock()
+        running = 0
+        max_running = 0
+
+        async def worker():
+            nonlocal running, max_running
+            async with lock("a"):
+                running += 1
+                max_running = max(max_running, running)
+                await asyncio.sleep(0)
+                running -= 1
+
+        await asyncio.gather(*(worker() for _ in range(100)))
+        self.assertEqual(max_running, 1)
+        # 使い終わったロックは破棄される
+        self.assertEqual(len(lock), 0)
+
+    async def test_different_keys_run_concurrently(self):
+        lock = locks.KeyedLock()
+        entered = asyncio.Event()
+
+        async def holder():
+            async with lock("a"):
+                await asyncio.wait_for(entered.wait(), timeout=1)
+
+        async def other():
+            async with lock("b"):
+                entered.set()
+
+        await asyncio.gather(holder(), other())
@@ -0,0 +1,58 @@
+import datetime
+import unittest
+
+from notifybot.libs import sessions
+
+BASE = datetime.datetime(2022, 3, 1, 21, 0, 0)
+
+
+def at(minutes: int) -> datetime.datetime:
+    return BASE + datetime.timedelta(minutes=minutes)
+
+
+class SessionTrackerTest(unittest.TestCase):
+    def test_enter_and_exit(self):
+        tracker = sessions.SessionTracker()
+        tracker.enter(1, "general", 100, "alice", at(0))
+        tracker.enter(1, "general", 200, "bob", at(5))
+        # 入室済みのメンバーの入室時間は変わらない
+        tracker.enter(1, "general", 100, "alice", at(10))
+
+        session, = tracker.snapshot()
+        self.assertEqual(session.channel_name, "general")
+        self.assertEqual(session.started_at, at(0))
+        self.assertEqual(session.members[100].joined_at, at(0))
+        self.assertEqual(session.members[200].name, "bob")
+
+        tracker.exit(1, 100)
+        self.assertEqual(list(tracker.snapshot()[0].members), [200])
+
+        # 全員退室したら通話はなくなる
+        tracker.exit(1, 200)
+        self.assertEqual(tracker.snapshot(), [])
+        tracker.exit(1, 200)
+
+    def test_snapshot_order_and_copy(self):
+        tracker = sessions.SessionTracker()
+        tracker.enter(2, "game", 100, "alice", at(10))
+        tracker.enter(1, "general", 200, "bob", at(0))
+
+        snapshot = tracker.snapshot()
+        self.assertEqual([s.channel_id for s in snapshot], [1, 2])
+
+        snapshot[0].members.clear()
+        self.assertEqual(list(tracker.snapshot()[0].members), [200])
+
+    def test_sync(self):
+        tracker = sessions.SessionTracker()
+        tracker.enter(1, "general", 100, "alice", at(0))
+        tracker.enter(1, "general", 200, "bob", at(0))
+
+        tracker.sync(1, "general", {100: "alice", 300: "carol"}, at(30))
+        session, = tracker.snapshot()
+        self.assertEqual(set(session.members), {100, 300})
+        self.assertEqual(session.members[100].joined_at, at(0))
+        self.assertEqual(session.members[300].joined_at, at(30))
+
+        tracker.sync(1, "general", {}, at(60))
+        self.assertEqual(len(tracker), 0)
@@ -0,0 +1,128 @@
+"""aiomysqlの代わりに使うプロセス内のスタンドインサーバー
+
+MySQLStorageが使うaiomysqlのAPI(コネクションプール・コネクション・カーソル)だけを実装し、
+MySQLのクエリをSQLiteで実行できる形に書き換えて一時ファイルのSQLiteで実行する\\
+プールから取得するコネクションはそれぞれ別のSQLite接続になるため、プールと並行した記録の扱いも確認できる
+
+MySQL固有の構文や照合順序、ロックの挙動は確認できないため、CIではMariaDBに対してもテストする
+"""
+import asyncio
+import contextlib
+import datetime
+import re
+import sqlite3
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+DATETIME_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(\.\d+)?$")
+
+# create_poolが呼ばれた回数と引数
+created_pools: List[Dict[str, Any]] = []
+
+
+def _to_sqlite_query(query: str) -> str:
+    query = re.sub(r",\s*INDEX \([^)]*\)", "", query)
+    query = query.replace("UNIQUE KEY (", "UNIQUE (")
+    query = query.replace("DEFAULT CHARSET=utf8mb4", "")
+    # SQLiteの文字列比較はもともと大文字小文字を区別する
+    query = query.replace("COLLATE utf8mb4_bin", "")
+    query = query.replace("INSERT IGNORE", "INSERT OR IGNORE")
+    query = re.sub(r"%\((\w+)\)s", r":\1", query)
+    return query.replace("%s", "?")
+
+
+def _to_sqlite_value(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+    return value
+
+
+def _from_sqlite_value(value: Any) -> Any:
+    # DATETIME型の列はaiomysqlと同じくdatetimeで返す
+    if isinstance(value, str) and DATETIME_PATTERN.match(value):
+        return datetime.datetime.fromisoformat(value)
+    return value
+
+
+async def _execute(con: sqlite3.Connection, cur: sqlite3.Cursor, query: str, args: Any = ()) -> None:
+    # 他のコネクションのトランザクションが終わるまで、イベントループを止めずに待つ
+    while True:
+        try:
+            cur.execute(query, args)
+            return
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            await asyncio.sleep(0.001)
+
+
+class Cursor:
+    def __init__(self, con: sqlite3.Connection) -> None:
+        self._con = con
+        self._cur = con.cursor()
+
+    @property
+    def rowcount(self) -> int:
+        return self._cur.rowcount
+
+    async def execute(self, query: str, args: Any = None) -> None:
+        if args is None:
+            args = ()
+        elif isinstance(args, dict):
+            args = {k: _to_sqlite_value(v) for k, v in args.items()}
+        else:
+            args = tuple(_to_sqlite_value(v) for v in args)
+        await asyncio.sleep(0)
+        await _execute(self._con, self._cur, _to_sqlite_query(query), args)
+
+    async def fetchone(self) -> Optional[tuple]:
+        row = self._cur.fetchone()
+        return None if row is None else tuple(_from_sqlite_value(v) for v in row)
+
+    async def fetchall(self) -> List[tuple]:
+        return [tuple(_from_sqlite_value(v) for v in row) for row in self._cur.fetchall()]
+
+
+class Connection:
+    def __init__(self, db_name: str) -> None:
+        # autocommit=Trueのプールと同じく、クエリごとに確定する
+        self._con = sqlite3.connect(db_name, isolation_level=None, timeout=0)
+
+    @contextlib.asynccontextmanager
+    async def cursor(self) -> AsyncIterator[Cursor]:
+        yield Cursor(self._con)
+
+    def close(self) -> None:
+        self._con.close()
+
+
+class Pool:
+    def __init__(self, db_name: str, maxsize: int) -> None:
+        self._db_name = db_name
+        self._semaphore = asyncio.Semaphore(maxsize)
+        self._connections: List[Connection] = []
+        self.closed = False
+
+    @contextlib.asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Connection]:
+        async with self._semaphore:
+            conn = self._connections.pop() if self._connections else Connection(self._db_name)
+            try:
+                yield conn
+            finally:
+                self._connections.append(conn)
+
+    def close(self) -> None:
+        self.closed = True
+        for conn in self._connections:
+            conn.close()
+        self._connections.clear()
+
+    async def wait_closed(self) -> None:
+        pass
+
+
+async def create_pool(*, db: str, maxsize: int = 10, **kwargs: Any) -> Pool:
+    created_pools.append(dict(db=db, maxsize=maxsize, **kwargs))
+    # 接続に時間がかかる場合と同じく、作成中に他の処理へ切り替わるようにする
+    await asyncio.sleep(0)
+    return Pool(db, maxsize)
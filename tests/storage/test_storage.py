@@ -0,0 +1,206 @@
+import asyncio
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from notifybot.storage import MySQLStorage, SQLiteStorage
+from notifybot.vars import Data
+
+from . import fake_aiomysql
+
+JST = datetime.timezone(datetime.timedelta(hours=9))
+BASE = datetime.datetime(2022, 3, 1, 21, 0, 0, 123456, tzinfo=JST)
+
+
+def at(minutes: int) -> datetime.datetime:
+    return BASE + datetime.timedelta(minutes=minutes)
+
+
+def naive(dt: datetime.datetime) -> datetime.datetime:
+    return dt.replace(tzinfo=None)
+
+
+class StorageContract:
+    """すべてのストレージ実装が満たすべき振る舞い
+
+    サブクラスでasyncSetUpを実装してself.storageに空のストレージを用意する
+    """
+
+    async def asyncTearDown(self):
+        await self.storage.close()
+
+    async def test_init_twice(self):
+        await self.storage.init()
+        self.assertEqual(await self.storage.fetch_access_times(), [])
+
+    async def test_is_commitable(self):
+        self.assertTrue(await self.storage.is_commitable(1, "general"))
+        self.assertFalse(await self.storage.is_commitable(1, "general", is_enter=False))
+
+        await self.storage.commit_history(1, "general", at(0), True)
+        self.assertFalse(await self.storage.is_commitable(1, "general"))
+        self.assertTrue(await self.storage.is_commitable(1, "general", is_enter=False))
+        # 別のチャンネルには影響しない
+        self.assertTrue(await self.storage.is_commitable(1, "game"))
+
+        await self.storage.commit_history(1, "general", at(1), False)
+        self.assertTrue(await self.storage.is_commitable(1, "general"))
+        self.assertFalse(await self.storage.is_commitable(1, "general", is_enter=False))
+
+    async def test_is_all_member_exited_from(self):
+        await self.storage.commit_history(1, "general", at(0), True)
+        await self.storage.commit_history(2, "general", at(1), True)
+        self.assertFalse(await self.storage.is_all_member_exited_from("general"))
+
+        await self.storage.commit_history(1, "general", at(2), False)
+        self.assertFalse(await self.storage.is_all_member_exited_from("general"))
+
+        await self.storage.commit_history(2, "general", at(3), False)
+        self.assertTrue(await self.storage.is_all_member_exited_from("general"))
+
+    async def test_commit_access_time(self):
+        await self.storage.commit_history(1, "general", at(0), True)
+        await self.storage.commit_history(2, "general", at(5), True)
+        await self.storage.commit_history(1, "general", at(10), False)
+        await self.storage.commit_history(2, "general", at(30), False)
+
+        start, end = await self.storage.commit_access_time("general")
+        self.assertEqual(start, naive(at(0)))
+        self.assertEqual(end, naive(at(30)))
+
+        # 記録済みの通話より後の入退室だけが次の通話になる
+        await self.storage.commit_history(1, "general", at(60), True)
+        self.assertFalse(await self.storage.is_all_member_exited_from("general"))
+        await self.storage.commit_history(1, "general", at(90), False)
+        self.assertTrue(await self.storage.is_all_member_exited_from("general"))
+        start, end = await self.storage.commit_access_time("general")
+        self.assertEqual(start, naive(at(60)))
+        self.assertEqual(end, naive(at(90)))
+
+    async def test_commit_access_time_twice(self):
+        # 他のプロセスが先に同じ通話を記録した場合は何も記録しない
+        await self.storage.commit_history(1, "general", at(0), True)
+        await self.storage.commit_history(1, "general", at(10), False)
+        self.assertIsNotNone(await self.storage.commit_access_time("general"))
+        self.assertIsNone(await self.storage.commit_access_time("general"))
+        self.assertEqual(len(await self.storage.fetch_access_times("general")), 1)
+
+    async def test_is_already_entering(self):
+        await self.storage.commit_history(1, "general", at(0), True)
+        await self.storage.commit_history(2, "general", at(1), True)
+        self.assertFalse(await self.storage.is_already_entering(1, "general"))
+
+        # 通話中に退室して再入室した
+        await self.storage.commit_history(1, "general", at(2), False)
+        await self.storage.commit_history(1, "general", at(3), True)
+        self.assertTrue(await self.storage.is_already_entering(1, "general"))
+
+        await self.storage.commit_history(1, "general", at(4), False)
+        await self.storage.commit_history(2, "general", at(5), False)
+        await self.storage.commit_access_time("general")
+
+        # 通話が終わった後の入室は新しい通話になる
+        await self.storage.commit_history(1, "general", at(6), True)
+        self.assertFalse(await self.storage.is_already_entering(1, "general"))
+
+    async def test_fetch_access_times(self):
+        await self.storage.commit_history(1, "general", at(0), True)
+        await self.storage.commit_history(1, "general", at(10), False)
+        await self.storage.commit_access_time("general")
+        await self.storage.commit_history(1, "game", at(20), True)
+        await self.storage.commit_history(1, "game", at(40), False)
+        await self.storage.commit_access_time("game")
+
+        self.assertEqual(sorted(await self.storage.fetch_access_times()),
+                         [(naive(at(0)), naive(at(10))), (naive(at(20)), naive(at(40)))])
+        self.assertEqual(await self.storage.fetch_access_times("game"),
+                         [(naive(at(20)), naive(at(40)))])
+        self.assertEqual(await self.storage.fetch_access_times("music"), [])
+
+    async def test_channel_name_is_case_sensitive(self):
+        # 大文字小文字だけが異なるチャンネルは別のチャンネルとして記録する
+        await self.storage.commit_history(1, "General", at(0), True)
+        self.assertTrue(await self.storage.is_commitable(1, "general"))
+        self.assertTrue(await self.storage.is_all_member_exited_from("general"))
+
+        await self.storage.commit_history(1, "General", at(10), False)
+        await self.storage.commit_access_time("General")
+        self.assertIsNone(await self.storage.commit_access_time("general"))
+        self.assertEqual(await self.storage.fetch_access_times("General"),
+                         [(naive(at(0)), naive(at(10)))])
+        self.assertEqual(await self.storage.fetch_access_times("general"), [])
+
+
+class MySQLStorageContract(StorageContract):
+    """MySQLStorageが複数のプロセスから共有されるときの振る舞い"""
+
+    async def test_concurrent_commit_access_time(self):
+        # 複数のBotが同時に同じ通話を記録しても一件だけ記録される
+        await self.storage.commit_history(1, "general", at(0), True)
+        await self.storage.commit_history(1, "general", at(10), False)
+        replica = MySQLStorage(host=self.storage.host, port=self.storage.port,
+                               user=self.storage.user, password=self.storage.password,
+                               db=self.storage.db, pool_size=4)
+        results = await asyncio.gather(self.storage.commit_access_time("general"),
+                                       replica.commit_access_time("general"))
+        await replica.close()
+
+        self.assertEqual(sorted(results, key=lambda r: r is None),
+                         [(naive(at(0)), naive(at(10))), None])
+        self.assertEqual(len(await self.storage.fetch_access_times("general")), 1)
+
+
+class SQLiteStorageTest(StorageContract, unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.storage = SQLiteStorage(os.path.join(self.tmpdir.name, "test.sqlite3"))
+        await self.storage.init()
+
+
+class FakeServerMySQLStorageTest(MySQLStorageContract, unittest.IsolatedAsyncioTestCase):
+    """aiomysqlをプロセス内のスタンドインに置き換えてMySQLStorageを実行する"""
+
+    async def asyncSetUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        patcher = mock.patch.dict(sys.modules, {"aiomysql": fake_aiomysql})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        fake_aiomysql.created_pools.clear()
+
+        self.storage = MySQLStorage(host="localhost", port=3306, user="test", password="",
+                                    db=os.path.join(self.tmpdir.name, "server.sqlite3"),
+                                    pool_size=4)
+        await self.storage.init()
+
+    async def test_pool_is_created_once(self):
+        storage = MySQLStorage(host="localhost", port=3306, user="test", password="",
+                               db=os.path.join(self.tmpdir.name, "other.sqlite3"),
+                               pool_size=4)
+        fake_aiomysql.created_pools.clear()
+        pools = await asyncio.gather(*(storage._get_pool() for _ in range(10)))
+        self.assertEqual(len(set(map(id, pools))), 1)
+        self.assertEqual(len(fake_aiomysql.created_pools), 1)
+        self.assertEqual(fake_aiomysql.created_pools[0]["charset"], "utf8mb4")
+        await storage.close()
+
+
+# CIではMariaDBのサービスコンテナに対して実行する. ローカルでは次のように実行する
+# docker run --rm -d -p 3306:3306 -e MARIADB_ROOT_PASSWORD=test -e MARIADB_DATABASE=notifybot_test mariadb
+# TEST_DB_HOST=127.0.0.1 TEST_DB_PASSWORD=test python -m pytest tests/storage
+@unittest.skipUnless(os.getenv("TEST_DB_HOST"), "TEST_DB_HOST is not set")
+class MySQLStorageTest(MySQLStorageContract, unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.storage = MySQLStorage(host=os.environ["TEST_DB_HOST"],
+                                    port=int(os.getenv("TEST_DB_PORT", "3306")),
+                                    user=os.getenv("TEST_DB_USER", "root"),
+                                    password=os.getenv("TEST_DB_PASSWORD", ""),
+                                    db=os.getenv("TEST_DB_DATABASE", "notifybot_test"),
+                                    pool_size=4)
+        await self.storage._execute(f"DROP TABLE IF EXISTS {Data.VC_HISTORY_TABLE_NAME}")
+        await self.storage._execute(f"DROP TABLE IF EXISTS {Data.ACCESS_TIME_TABLE}")
+        await self.storage.init()
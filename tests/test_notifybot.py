@@ -0,0 +1,14 @@
+import unittest
+from unittest import mock
+
+import discord
+
+from notifybot.notifybot import NotifyBot
+
+
+class NotifyBotTest(unittest.IsolatedAsyncioTestCase):
+    async def test_close_storage(self):
+        storage = mock.AsyncMock()
+        bot = NotifyBot(intents=discord.Intents.default(), storage=storage)
+        await bot.close()
+        storage.close.assert_awaited_once()